@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+
+# Ajoute le dossier parent au PYTHONPATH (exécution en script depuis data_pipeline.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import PROFILE_JOUR
+from affluence_builder.get_affluence import load_affluence_table, day_hour_profiles
+from affluence_builder.ingest_validations import PROFILES_PATH
+from blobia.network import load_compiled_network
+from blobia.tables import table_source
+
+# -- Répertoires --
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+TENSOR_PATH = os.path.join(DATA_DIR, "affluence_tensor.npy")
+
+JOURS = list(PROFILE_JOUR.keys())
+HEURES = 24
+DEFAULT_AFFLUENCE = 0.2  # noeud absent de la table (même valeur que CompiledNetwork.affluence_vector)
+AFFLUENCE_COLUMNS = ["affluence_score"]  # colonnes de la table d'affluence lues (en plus des clés)
+PAS_MIN = 15             # pas de la table horaire du mode horaire (minutes)
+HORIZON_MIN = 240        # durée couverte par la table horaire, au-delà la dernière ligne s'applique
+
+def build_affluence_tensor(net, affluence_df):
+    """
+    Affluence de chaque noeud du réseau pour chaque (jour, heure) : tableau [7, 24, n_noeuds] float32,
+    dans l'ordre des noeuds du CompiledNetwork. Mêmes valeurs (à la précision float32 près) que
+    net.affluence_vector(get_affluence_mapping(affluence_df, jour, heure)), en une seule passe :
+    score de base x coefficient du jour x coefficient de l'heure, plafonné à 1.
+    """
+    base = {(row.station_key, row.ligne): row.affluence_score for row in affluence_df.itertuples()}
+    known = np.array([
+        (net.station_names[s], net.line_names[l]) in base for s, l in zip(net.station_of, net.line_of)
+    ], dtype=bool)
+    scores = net.affluence_vector(base, default=0.0)
+
+    profile_jour, profile_heure = day_hour_profiles()
+    coef_jour = np.array([profile_jour[j] for j in JOURS], dtype=np.float64)
+    coef_heure = np.array([profile_heure.get(h, 0.5) for h in range(HEURES)], dtype=np.float64)
+    tensor = np.minimum(1.0, scores[None, None, :] * coef_jour[:, None, None] * coef_heure[None, :, None])
+    tensor = np.where(known[None, None, :], tensor, DEFAULT_AFFLUENCE)
+    return tensor.astype(np.float32)
+
+def slot_index(jour, heure):
+    """
+    Indices (jour, heure) dans le tenseur ; ValueError si le créneau n'existe pas.
+    """
+    jour = str(jour).lower()
+    heure = int(heure)
+    if jour not in JOURS or not 0 <= heure < HEURES:
+        raise ValueError(f"Créneau inconnu : {jour} {heure}h")
+    return JOURS.index(jour), heure
+
+def affluence_timeline(tensor, jour, heure, minute=0, pas_min=PAS_MIN, horizon_min=HORIZON_MIN):
+    """
+    Table horaire du mode horaire de compiled_path_solver : tableau [horizon_min / pas_min + 1, n_noeuds],
+    la ligne k donnant l'affluence de chaque noeud k * pas_min minutes après le départ
+    (jour, heure:minute), interpolée linéairement entre les créneaux horaires du tenseur.
+    La semaine est circulaire : un trajet qui passe minuit lit le créneau du jour suivant.
+    """
+    j, h = slot_index(jour, heure)
+    semaine = np.asarray(tensor, dtype=np.float64).reshape(len(JOURS) * HEURES, -1)
+    t = (j * HEURES + h) + (minute + np.arange(horizon_min // pas_min + 1) * pas_min) / 60.0
+    t0 = np.floor(t).astype(np.int64)
+    f = (t - t0)[:, None]
+    n_slots = len(semaine)
+    return (1.0 - f) * semaine[t0 % n_slots] + f * semaine[(t0 + 1) % n_slots]
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+def _file_digest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def save_affluence_tensor(tensor, net, affluence_path, path=TENSOR_PATH):
+    np.save(path, tensor)
+    with open(_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump({
+            "network": net.fingerprint(),
+            "affluence": _file_digest(table_source(affluence_path)),
+            "profils": _file_digest(PROFILES_PATH),
+            "jours": JOURS,
+            "heures": HEURES,
+        }, f, ensure_ascii=False)
+
+def load_affluence_tensor(path, net, affluence_path):
+    """
+    Tenseur ouvert en memory-map, ou None s'il est absent, aligné sur un autre réseau ou
+    calculé à partir d'une autre version du CSV d'affluence ou des profils mesurés.
+    """
+    if not (os.path.exists(path) and os.path.exists(_meta_path(path))):
+        return None
+    with open(_meta_path(path), encoding="utf-8") as f:
+        meta = json.load(f)
+    if (meta.get("network") != net.fingerprint() or meta.get("jours") != JOURS
+            or meta.get("affluence") != _file_digest(table_source(affluence_path))
+            or meta.get("profils") != _file_digest(PROFILES_PATH)):
+        print(f"[WARN] Tenseur d'affluence {path} périmé : ignoré")
+        return None
+    return np.load(path, mmap_mode="r")
+
+def get_affluence_tensor(net, affluence_path, tensor_path=TENSOR_PATH):
+    """
+    Tenseur sauvegardé par la pipeline s'il est à jour, sinon recalculé depuis la table d'affluence.
+    """
+    tensor = load_affluence_tensor(tensor_path, net, affluence_path)
+    if tensor is None:
+        tensor = build_affluence_tensor(net, load_affluence_table(affluence_path, AFFLUENCE_COLUMNS))
+    return tensor
+
+if __name__ == "__main__":
+    net = load_compiled_network(os.path.join(DATA_DIR, "graph_compiled"), os.path.join(DATA_DIR, "graph_blobia.gpickle"))
+    affluence_path = os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv")
+    tensor = build_affluence_tensor(net, load_affluence_table(affluence_path, AFFLUENCE_COLUMNS))
+    save_affluence_tensor(tensor, net, affluence_path)
+    print(f"Tenseur d'affluence {tensor.shape} exporté dans {TENSOR_PATH}")
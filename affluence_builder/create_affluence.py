@@ -6,17 +6,11 @@ import numpy as np
 # Ajoute le dossier parent au PYTHONPATH pour importer utils.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils import BIG_HUBS_SCORE, LINE_SCORE, DEFAULT_LINE_SCORE
+from affluence_builder.ingest_validations import load_profiles
+from blobia.tables import save_table, read_table, table_path
+from blobia.names import normalize_names
 
 # -- Fonctions utilitaires --
-def normalize_station_key(name):
-    import unidecode
-    if name is None:
-        return ""
-    name = unidecode.unidecode(str(name))
-    name = name.lower().replace("-", " ").replace("’", "'").replace("`", "'").replace("–", " ")
-    name = " ".join(name.split())
-    return name.strip()
-
 def extract_main_line(ligne_str):
     s = str(ligne_str).strip().upper()
     parts = s.split()
@@ -25,64 +19,99 @@ def extract_main_line(ligne_str):
     else:
         return s
 
+def _map_unique(series, func):
+    """
+    Applique func une seule fois par valeur distincte (les noms se répètent d'une ligne à l'autre).
+    """
+    values = series.unique()
+    return series.map(dict(zip(values, map(func, values))))
+
 # -- Chemins fichiers --
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_PATH = os.path.join(BASE_DIR, 'data', 'Stations_IDF_aligned.csv')
 OUTPUT_PATH = os.path.join(BASE_DIR, 'data', 'Stations_IDF_aligned_affluence.csv')
 
-# -- Chargement du dataset --
-df = pd.read_csv(DATA_PATH)
-df["station_key"] = df["station_key"].astype(str).apply(normalize_station_key)
-df["ligne"] = df["ligne"].astype(str)
-df["main_line"] = df["ligne"].apply(extract_main_line)
+PROPAGATION_FACTOR = 0.9
+SCORE_MIN = 0.15
+
+def _decay_fill(scores, groups, reverse=False):
+    """
+    Propagation le long d'une ligne (tableaux triés par ligne puis ordre) : chaque trou qui suit
+    une valeur connue de la même ligne reçoit max(SCORE_MIN, précédente x PROPAGATION_FACTOR).
+    Valeur connue et distance viennent d'un forward fill par ligne ; le facteur est appliqué
+    par multiplications successives (une passe vectorisée par rang), pour retrouver exactement
+    les valeurs de la propagation de proche en proche.
+    """
+    s = pd.Series(scores[::-1] if reverse else scores)
+    g = pd.Series(groups[::-1] if reverse else groups)
+    pos = pd.Series(np.arange(len(s)), dtype=float).where(s.notna())
+    last_pos = pos.groupby(g).ffill().to_numpy()
+    value = s.groupby(g).ffill().to_numpy()
+    dist = np.arange(len(s)) - last_pos  # NaN : aucune valeur connue avant sur la ligne
 
-# -- Colonne affluence_score vide --
-df["affluence_score"] = np.nan
+    for k in range(1, int(np.nanmax(dist, initial=0)) + 1):
+        value = np.where(dist >= k, value * PROPAGATION_FACTOR, value)
+    filled = np.where(dist > 0, np.maximum(SCORE_MIN, value), s.to_numpy())
+    return filled[::-1] if reverse else filled
 
-# 1. Affecte le score des BIG_HUBS sur toutes les lignes où ils apparaissent
-for idx, row in df.iterrows():
-    s_key = row["station_key"]
-    score_hub = BIG_HUBS_SCORE.get(s_key, None)
-    if score_hub is not None:
-        df.at[idx, "affluence_score"] = score_hub  # score hub absolu, non pondéré
+def compute_affluence_scores(df, profiles=None):
+    """
+    Score d'affluence de base de chaque (station, ligne) : hubs, bonus de correspondance,
+    propagation le long de chaque branche puis minimum. Renvoie une copie de df avec les
+    colonnes main_line et affluence_score.
+    profiles : AffluenceProfiles (affluence_builder/ingest_validations.py) ; les stations
+               mesurées prennent leur score mesuré, les règles ci-dessus ne complètent que les autres.
+    """
+    df = df.copy()
+    df["station_key"] = normalize_names(df["station_key"])
+    df["ligne"] = df["ligne"].astype(str)
+    df["main_line"] = _map_unique(df["ligne"], extract_main_line)
 
-# 2. Bonus pour correspondances (multi-lignes) non hubs
-corresp = df.groupby("station_key")["main_line"].nunique()
-for s_key, n_lines in corresp[corresp > 1].items():
-    if pd.isna(df.loc[df["station_key"] == s_key, "affluence_score"]).all():
-        bonus = 0.5 + 0.05 * min(n_lines, 5)  # 0.5 à 0.75 max
-        for idx in df[df["station_key"] == s_key].index:
-            main_line = df.at[idx, "main_line"]
-            line_score = LINE_SCORE.get(main_line, DEFAULT_LINE_SCORE)
-            affluence = min(1.0, bonus * line_score)
-            df.at[idx, "affluence_score"] = affluence
+    # 1. Score des BIG_HUBS sur toutes les lignes où ils apparaissent (score hub absolu, non pondéré)
+    scores = df["station_key"].map(BIG_HUBS_SCORE).astype(float)
+    if profiles is not None:
+        mesures = pd.Series(
+            [profiles.station_score(s, l) for s, l in zip(df["station_key"], df["ligne"])],
+            index=df.index, dtype=float
+        )
+        scores = mesures.fillna(scores)
 
-# 3. Propagation sur chaque branche réelle (ligne), pas juste main_line !
-PROPAGATION_FACTOR = 0.9
-SCORE_MIN = 0.15
-for ligne, group in df.groupby("ligne"):
-    indices = group.sort_values("ordre").index.tolist()
-    # Sens croissant
-    for i in range(1, len(indices)):
-        if pd.isna(df.at[indices[i], "affluence_score"]) and not pd.isna(df.at[indices[i-1], "affluence_score"]):
-            df.at[indices[i], "affluence_score"] = max(SCORE_MIN, df.at[indices[i-1], "affluence_score"] * PROPAGATION_FACTOR)
-    # Sens décroissant
-    for i in range(len(indices)-2, -1, -1):
-        if pd.isna(df.at[indices[i], "affluence_score"]) and not pd.isna(df.at[indices[i+1], "affluence_score"]):
-            df.at[indices[i], "affluence_score"] = max(SCORE_MIN, df.at[indices[i+1], "affluence_score"] * PROPAGATION_FACTOR)
+    # 2. Bonus pour correspondances (multi-lignes) non hubs
+    n_lines = df.groupby("station_key")["main_line"].transform("nunique")
+    no_score = scores.isna().groupby(df["station_key"]).transform("all")
+    corresp = (n_lines > 1) & no_score
+    bonus = 0.5 + 0.05 * np.minimum(n_lines[corresp], 5)  # 0.5 à 0.75 max
+    line_score = df.loc[corresp, "main_line"].map(LINE_SCORE).fillna(DEFAULT_LINE_SCORE)
+    scores[corresp] = np.minimum(1.0, bonus * line_score)
+
+    # 3. Propagation sur chaque branche réelle (ligne), pas juste main_line : sens croissant puis décroissant
+    order = np.lexsort((df["ordre"].to_numpy(), df["ligne"].to_numpy()))
+    groups = df["ligne"].to_numpy()[order]
+    values = scores.to_numpy()[order]
+    values = _decay_fill(values, groups)
+    values = _decay_fill(values, groups, reverse=True)
+    scores.iloc[order] = values
 
-# 4. Remplis les trous par le minimum
-df["affluence_score"] = df["affluence_score"].fillna(SCORE_MIN)
+    # 4. Remplis les trous par le minimum, 5. normalise max à 1.0 (au cas où)
+    df["affluence_score"] = scores.fillna(SCORE_MIN).clip(upper=1.0)
+    return df
 
-# 5. Normalise max à 1.0 (au cas où)
-df["affluence_score"] = df["affluence_score"].clip(upper=1.0)
+def create_affluence(data_path=DATA_PATH, output_path=OUTPUT_PATH, stations=None):
+    """
+    Scores d'affluence des stations alignées (passées en mémoire, ou relues depuis la table de data_path).
+    """
+    if stations is None:
+        stations = read_table(data_path)
+    df = compute_affluence_scores(stations, load_profiles())
+    save_table(df, output_path)
+    print(f"Table générée : {table_path(output_path)}")
+    return df
 
-# 6. Sauvegarde
-df.to_csv(OUTPUT_PATH, index=False)
-print(f"Fichier généré : {OUTPUT_PATH}")
+if __name__ == "__main__":
+    df = create_affluence()
 
-# 7. Affiche quelques stats de vérif
-print("\nDistribution des scores :")
-print(df["affluence_score"].describe())
-print("\nTop 15 stations les plus affluentes :")
-print(df.sort_values("affluence_score", ascending=False)[["station_key", "main_line", "affluence_score"]].head(15))
+    # Quelques stats de vérif
+    print("\nDistribution des scores :")
+    print(df["affluence_score"].describe())
+    print("\nTop 15 stations les plus affluentes :")
+    print(df.sort_values("affluence_score", ascending=False)[["station_key", "main_line", "affluence_score"]].head(15))
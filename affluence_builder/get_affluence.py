@@ -1,33 +1,68 @@
 import os
-import pandas as pd
 import sys
+import numpy as np
 
 # Importe les profils jour/heure directement depuis utils
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils import PROFILE_JOUR, PROFILE_HEURE
+from affluence_builder.ingest_validations import load_profiles, PROFILES_PATH
+from blobia.tables import read_table
 
 SCORE_MIN = 0.15
 
+_profiles_cache = {}
+
+def day_hour_profiles(path=PROFILES_PATH):
+    """
+    Coefficients (jour, heure) : profils mesurés (affluence_builder/ingest_validations.py) s'ils
+    existent, complétés par PROFILE_JOUR / PROFILE_HEURE pour les jours et heures non couverts.
+    Relus seulement quand le fichier change.
+    """
+    signature = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    if _profiles_cache.get("signature") != signature or "profiles" not in _profiles_cache:
+        profile_jour, profile_heure = dict(PROFILE_JOUR), dict(PROFILE_HEURE)
+        profiles = load_profiles(path)
+        if profiles is not None:
+            profile_jour.update(profiles.jour)
+            profile_heure.update(profiles.heure)
+        _profiles_cache["signature"] = signature
+        _profiles_cache["profiles"] = (profile_jour, profile_heure)
+    return _profiles_cache["profiles"]
+
 def get_affluence_mapping(affluence_df, jour, heure):
     """
     Retourne { (station_key, ligne): affluence_dynamique } pour le jour/heure demandés.
+    Usage historique (blob_path_solver sur graphe NetworkX, apply_affluence_to_graph) : les recherches
+    sur CompiledNetwork lisent le tenseur (affluence_tensor.get_affluence_tensor / slot_index).
     """
-    coef_jour = PROFILE_JOUR.get(jour.lower(), 0.7)
-    coef_heure = PROFILE_HEURE.get(int(heure), 0.5)
-    mapping = {}
-    for _, row in affluence_df.iterrows():
-        score = min(1.0, row['affluence_score'] * coef_jour * coef_heure)
-        mapping[(row['station_key'], row['ligne'])] = score
-    return mapping
+    profile_jour, profile_heure = day_hour_profiles()
+    coef_jour = profile_jour.get(jour.lower(), 0.7)
+    coef_heure = profile_heure.get(int(heure), 0.5)
+    scores = np.minimum(1.0, affluence_df['affluence_score'].to_numpy(dtype=np.float64) * coef_jour * coef_heure)
+    return dict(zip(zip(affluence_df['station_key'], affluence_df['ligne']), scores.tolist()))
 
-def get_affluence_mapping_from_file(affluence_path, jour, heure):
+def normalize_affluence_table(df):
     """
-    Version qui lit directement le CSV. (Facultatif)
+    Normalise les clés (station_key, ligne) d'une table d'affluence.
     """
-    df = pd.read_csv(affluence_path)
     df["station_key"] = df["station_key"].astype(str).str.strip().str.lower()
     df["ligne"] = df["ligne"].astype(str).str.strip()
-    return get_affluence_mapping(df, jour, heure)
+    return df
+
+def load_affluence_table(affluence_path, columns=None):
+    """
+    Lit la table d'affluence (version en colonnes, sinon le CSV) et normalise les clés (station_key, ligne).
+    columns : colonnes à lire en plus de station_key et ligne (toutes si None).
+    """
+    if columns is not None:
+        columns = ["station_key", "ligne"] + [c for c in columns if c not in ("station_key", "ligne")]
+    return normalize_affluence_table(read_table(affluence_path, columns))
+
+def get_affluence_mapping_from_file(affluence_path, jour, heure):
+    """
+    Version qui lit directement le CSV. (Facultatif)
+    """
+    return get_affluence_mapping(load_affluence_table(affluence_path), jour, heure)
 
 def apply_affluence_to_graph(G, affluence_mapping):
     """
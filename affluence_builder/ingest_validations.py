@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import glob
+import gzip
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Ajoute le dossier parent au PYTHONPATH (exécution en script depuis data_pipeline.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import correspondances_physiques_groupes, PROFILE_JOUR
+from graph_builder.normalize import build_synonym_mapping, map_names_to_master
+from blobia.names import normalize_name, normalize_names
+
+# -- Répertoires --
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+VALIDATIONS_DIR = os.path.join(DATA_DIR, "validations")
+PROFILES_PATH = os.path.join(DATA_DIR, "affluence_profiles.npz")
+
+JOURS = list(PROFILE_JOUR.keys())
+CHUNKSIZE = 500_000
+SCORE_QUANTILE = 0.99  # score de station = validations / ce quantile (les quelques très gros hubs plafonnent à 1)
+
+# Noms de colonnes acceptés pour chaque champ (journaux de validations open data IDFM et variantes)
+COLUMNS = {
+    "date": ("JOUR", "jour", "date", "DATE"),
+    "station": ("LIBELLE_ARRET", "libelle_arret", "station", "nom_arret"),
+    "tranche": ("TRNC_HORR_60", "trnc_horr_60", "tranche_horaire", "heure"),
+    "validations": ("NB_VALD", "nb_vald", "validations", "nb_validations"),
+    "ligne": ("LIGNE", "ligne"),
+}
+REQUIRED = ("date", "station", "validations")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y")
+JOURNALIER = -1         # heure des comptages journaliers (fichier sans tranche horaire)
+TRANCHE_INCONNUE = -2   # tranche horaire absente ou masquée ("ND") d'un comptage horaire
+MOINS_DE_5 = 2.5        # comptage masqué "Moins de 5" (1 à 4 validations) : milieu de l'intervalle
+
+# -- Lecture par blocs --
+
+def _open_text(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+def read_header(path):
+    """
+    Séparateur (';', ',' ou tabulation) et colonnes retenues { champ: colonne } d'un journal de validations.
+    """
+    with _open_text(path) as f:
+        header = f.readline().lstrip("﻿")
+    sep = max((";", ",", "\t"), key=header.count)
+    names = [c.strip() for c in header.rstrip("\r\n").split(sep)]
+    columns = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = alias
+                break
+    missing = [f for f in REQUIRED if f not in columns]
+    if missing:
+        raise ValueError(f"{path} : colonnes introuvables pour {missing} (en-tête : {names})")
+    return sep, columns
+
+def iter_validation_chunks(paths, chunksize=CHUNKSIZE):
+    """
+    Blocs (DataFrame) de chaque fichier, colonnes renommées en champs de COLUMNS :
+    seules les colonnes utiles sont lues, jamais le fichier entier.
+    """
+    for path in paths:
+        sep, columns = read_header(path)
+        rename = {col: field for field, col in columns.items()}
+        reader = pd.read_csv(path, sep=sep, usecols=list(columns.values()), dtype=str,
+                             chunksize=chunksize, encoding="utf-8")
+        for chunk in reader:
+            yield chunk.rename(columns=rename)
+
+# -- Décodage (une fois par valeur distincte de chaque bloc) --
+
+def _map_unique(series, func):
+    values = series.unique()
+    return series.map(dict(zip(values, map(func, values))))
+
+def parse_date(value):
+    """
+    Date (datetime.date) d'un champ JOUR quel que soit son format, None si illisible.
+    """
+    value = str(value).strip()[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_validations(series):
+    """
+    Nombres de validations d'un bloc : "Moins de 5" vaut MOINS_DE_5, les autres valeurs illisibles 0.
+    """
+    counts = pd.to_numeric(series, errors="coerce").astype(np.float64)
+    masked = counts.isna()
+    if masked.any():
+        moins_de_5 = series[masked].str.strip().str.lower().str.startswith("moins de 5", na=False)
+        counts[masked] = np.where(moins_de_5, MOINS_DE_5, 0.0)
+    return counts
+
+def parse_hour(value):
+    """
+    Heure de début d'une tranche horaire ("7H-8H", "07:00-08:00", "7"), TRANCHE_INCONNUE si absente ou "ND".
+    """
+    m = re.match(r"\s*(\d{1,2})", str(value))
+    if m is None or not 0 <= int(m.group(1)) < 24:
+        return TRANCHE_INCONNUE
+    return int(m.group(1))
+
+# -- Agrégation à mémoire bornée --
+
+class ValidationAggregator:
+    """
+    Validations cumulées par (station_key, ligne, jour de semaine, heure), bloc après bloc.
+    La mémoire ne dépend que du nombre de clés distinctes (stations x lignes x 7 x 26), pas du
+    volume de données. Les noms de stations passent par le même mapping de synonymes que
+    graph_builder/normalize.py ; ligne vaut "" quand le journal ne la donne pas (validations
+    comptées à la station), heure vaut JOURNALIER pour les comptages journaliers.
+    """
+
+    KEYS = ["station_key", "ligne", "jour", "heure"]
+
+    def __init__(self):
+        self.synonyms = build_synonym_mapping(correspondances_physiques_groupes, normalize_name)
+        self.totals = None
+        self.dates = [set() for _ in JOURS]  # dates (datetime.date) distinctes par jour de semaine
+        self.rows = 0
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        # Dates décodées une fois par valeur distincte ; les jours distincts sont comptés sur la
+        # date elle-même, pas sur son texte ("2023-01-02" et "02/01/2023" sont le même jour)
+        dates = {value: parse_date(value) for value in chunk["date"].unique()}
+        for date in dates.values():
+            if date is not None:
+                self.dates[date.weekday()].add(date)
+        weekdays = {value: (-1 if date is None else date.weekday()) for value, date in dates.items()}
+        part = pd.DataFrame({
+            "station_key": map_names_to_master(normalize_names(chunk["station"]), self.synonyms),
+            "ligne": chunk["ligne"].fillna("").str.strip() if "ligne" in chunk else "",
+            "jour": chunk["date"].map(weekdays).astype(np.int8),
+            "heure": (_map_unique(chunk["tranche"], parse_hour) if "tranche" in chunk else JOURNALIER),
+            "validations": parse_validations(chunk["validations"]),
+        })
+        part["heure"] = part["heure"].astype(np.int8)
+        valid = part["jour"] >= 0
+
+        part = part[valid].groupby(self.KEYS, sort=False)["validations"].sum()
+        if self.totals is None:
+            self.totals = part
+        else:
+            self.totals = pd.concat([self.totals, part]).groupby(level=self.KEYS, sort=False).sum()
+
+    def table(self):
+        """
+        Table colonnes station_key, ligne, jour, heure, validations (moyenne par jour de ce type).
+        """
+        if self.totals is None:
+            raise ValueError("Aucune validation agrégée")
+        table = self.totals.reset_index()
+        n_dates = np.array([max(1, len(d)) for d in self.dates], dtype=np.float64)
+        table["validations"] = table["validations"] / n_dates[table["jour"].to_numpy()]
+        return table
+
+# -- Profils d'affluence --
+
+class AffluenceProfiles:
+    """
+    Profils mesurés qui remplacent les constantes de utils.py :
+      - jour : { jour: coefficient } (PROFILE_JOUR), validations moyennes du jour / jour le plus chargé
+      - heure : { heure: coefficient } (PROFILE_HEURE), validations de l'heure / heure la plus chargée
+      - station_scores : { (station_key, ligne): score de base } (BIG_HUBS_SCORE, LINE_SCORE),
+        ligne "" pour un score de station toutes lignes confondues
+    Les comptages journaliers servent aux jours et aux stations s'ils existent, sinon les
+    comptages horaires (tranches inconnues comprises).
+    """
+
+    def __init__(self, table):
+        self.table = table
+        horaire = table[table["heure"] >= 0]
+        journalier = table[table["heure"] == JOURNALIER]
+        if journalier.empty:
+            journalier = table[table["heure"] != JOURNALIER]
+
+        par_jour = journalier.groupby("jour")["validations"].sum().reindex(range(len(JOURS)))
+        self.jour = {
+            j: float(v) for j, v in zip(JOURS, (par_jour / par_jour.max()).to_numpy()) if not np.isnan(v)
+        }
+        par_heure = horaire.groupby("heure")["validations"].sum()
+        self.heure = {int(h): float(v) for h, v in (par_heure / par_heure.max()).items()} if len(par_heure) else {}
+
+        par_station = journalier.groupby(["station_key", "ligne"])["validations"].sum()
+        scores = (par_station / par_station.quantile(SCORE_QUANTILE)).clip(upper=1.0)
+        self.station_scores = {key: float(v) for key, v in scores.items()}
+
+    def station_score(self, station_key, ligne):
+        score = self.station_scores.get((station_key, ligne))
+        return self.station_scores.get((station_key, "")) if score is None else score
+
+def save_profiles(table, path=PROFILES_PATH):
+    """
+    Table agrégée en colonnes NumPy (.npz), relue sans pandas ni analyse de texte.
+    """
+    np.savez(
+        path,
+        station_key=table["station_key"].to_numpy(dtype=str),
+        ligne=table["ligne"].to_numpy(dtype=str),
+        jour=table["jour"].to_numpy(dtype=np.int8),
+        heure=table["heure"].to_numpy(dtype=np.int8),
+        validations=table["validations"].to_numpy(dtype=np.float64),
+    )
+
+def load_profiles(path=PROFILES_PATH):
+    """
+    AffluenceProfiles mesurés, ou None si l'étape d'ingestion n'a pas été lancée.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        table = pd.DataFrame({name: data[name] for name in data.files})
+    return AffluenceProfiles(table)
+
+def ingest_validations(paths, output_path=PROFILES_PATH, chunksize=CHUNKSIZE):
+    aggregator = ValidationAggregator()
+    t0 = time.time()
+    for chunk in iter_validation_chunks(paths, chunksize):
+        aggregator.add(chunk)
+        print(f"[VALIDATIONS] {aggregator.rows} lignes lues ({time.time() - t0:.0f}s)")
+    table = aggregator.table()
+    save_profiles(table, output_path)
+    return table
+
+if __name__ == "__main__":
+    paths = sorted(
+        p for ext in ("*.csv", "*.csv.gz", "*.txt", "*.txt.gz")
+        for p in glob.glob(os.path.join(VALIDATIONS_DIR, ext))
+    )
+    if not paths:
+        print(f"Aucun journal de validations dans {VALIDATIONS_DIR} : profils de utils.py conservés")
+        sys.exit(0)
+    table = ingest_validations(paths)
+    profiles = AffluenceProfiles(table)
+    print(f"Profils d'affluence exportés dans {PROFILES_PATH} : {len(profiles.station_scores)} stations/lignes")
+    print("Profil jour  :", {j: round(v, 2) for j, v in profiles.jour.items()})
+    print("Profil heure :", {h: round(v, 2) for h, v in sorted(profiles.heure.items())})
@@ -1,12 +1,12 @@
 import os
-import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 from geopy.distance import geodesic
 
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils import PROFILE_JOUR, PROFILE_HEURE
+from affluence_builder.get_affluence import day_hour_profiles
+from blobia.tables import read_table
 
 SCORE_MIN = 0.15  # score minimum utilisé à la création
 
@@ -16,17 +16,18 @@ def visualize_graph_dynamique(jour="lundi", heure=8):
     stations_path = os.path.join(DATA_DIR, 'stations_lignes_coords.csv')
     affluence_path = os.path.join(DATA_DIR, 'Stations_IDF_aligned_affluence.csv')
 
-    stations = pd.read_csv(stations_path)
+    stations = read_table(stations_path, columns=["station_key", "station", "ligne", "latitude", "longitude"])
     stations["station_key"] = stations["station_key"].astype(str).str.strip().str.lower()
     stations["ligne"] = stations["ligne"].astype(str).str.strip()
-    afflu = pd.read_csv(affluence_path)
+    afflu = read_table(affluence_path, columns=["station_key", "ligne", "affluence_score"])
     afflu["station_key"] = afflu["station_key"].astype(str).str.strip().str.lower()
     afflu["ligne"] = afflu["ligne"].astype(str).str.strip()
 
     afflu_dict = {(row["station_key"], row["ligne"]): row["affluence_score"] for _, row in afflu.iterrows()}
 
-    coef_jour = PROFILE_JOUR.get(jour.lower(), 0.7)
-    coef_heure = PROFILE_HEURE.get(int(heure), 0.5)
+    profile_jour, profile_heure = day_hour_profiles()
+    coef_jour = profile_jour.get(jour.lower(), 0.7)
+    coef_heure = profile_heure.get(int(heure), 0.5)
 
     G = nx.Graph()
     for _, row in stations.iterrows():
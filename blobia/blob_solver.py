@@ -1,25 +1,180 @@
 import heapq
-from collections import defaultdict
+import time
+import itertools
 
-def normalize_line(line):
-    parts = str(line).upper().split()
-    if parts[0] in {"RER", "METRO"} and len(parts) > 1:
-        return f"{parts[0]} {parts[1]}"
-    return str(line).upper()
+from blobia.network import normalize_line, compile_network
+from blobia.explore_sink import ExploredListSink, TeeSink
 
-def blob_path_solver(
-    G,
-    affluence_mapping,
-    nodes_depart,
-    nodes_arrivee,
-    curseur=1,
-    verbose=False,
-    max_iter=25000,
-    max_visites_station=2,
-    topk=10,
-    return_all_explored=False
-):
+INF = float("inf")
+
+class Label:
+    """
+    Etiquette de recherche : un arrêt + un pointeur vers l'étiquette parente.
+    Le chemin complet n'est reconstruit qu'à la demande (routes finales).
+    """
+    __slots__ = (
+        "parent", "node", "ligne", "affluence", "aff_sum", "depth",
+        "station", "logique", "passages", "logiques", "score", "minutes", "trace_id"
+    )
+
+    def __init__(self, parent, node, ligne, affluence, station, logique, score=0.0, minutes=0.0):
+        self.parent = parent
+        self.score = score
+        self.minutes = minutes
+        self.node = node
+        self.ligne = ligne
+        self.affluence = affluence
+        self.station = station
+        self.logique = logique
+        self.passages = None
+        self.logiques = None
+        self.trace_id = -1  # indice de l'événement dans une trace binaire (explore_sink.BinaryTraceSink)
+        if parent is None:
+            self.aff_sum = affluence
+            self.depth = 1
+        else:
+            self.aff_sum = parent.aff_sum + affluence
+            self.depth = parent.depth + 1
+
+    def loop_state(self):
+        """
+        Etat anti-boucle du chemin : passages par station et couples (station, ligne logique).
+        Calculé une seule fois, à l'expansion, à partir de celui du parent.
+        """
+        if self.passages is None:
+            # Etiquettes non développées (noeuds traversés par un raccourci) : on remonte jusqu'au
+            # premier ancêtre dont l'état est connu, puis une seule copie
+            pending = []
+            label = self
+            while label is not None and label.passages is None:
+                pending.append(label)
+                label = label.parent
+            if label is None:
+                passages, logiques = {}, set()
+            else:
+                passages, logiques = dict(label.passages), set(label.logiques)
+            for label in reversed(pending):
+                passages[label.station] = passages.get(label.station, 0) + 1
+                logiques.add((label.station, label.logique))
+            self.passages = passages
+            self.logiques = logiques
+        return self.passages, self.logiques
+
+    def unwind(self):
+        """
+        Retourne (path, affluences, lignes) de la racine jusqu'à cette étiquette.
+        """
+        path, affluences, lignes = [], [], []
+        label = self
+        while label is not None:
+            path.append(label.node)
+            affluences.append(label.affluence)
+            lignes.append(label.ligne)
+            label = label.parent
+        path.reverse()
+        affluences.reverse()
+        lignes.reverse()
+        return path, affluences, lignes
+
+    def path(self):
+        return self.unwind()[0]
+
+    def __lt__(self, other):
+        # Départage à score et noeud égaux : même ordre que l'ancien tas (comparaison des chemins).
+        # On compare au premier noeud qui diffère sous l'ancêtre commun, sans reconstruire les chemins.
+        a, b = self, other
+        while a.depth > b.depth:
+            a = a.parent
+        while b.depth > a.depth:
+            b = b.parent
+        if a is b:
+            return self.depth < other.depth
+        while a.parent is not b.parent:
+            a = a.parent
+            b = b.parent
+        if a.node != b.node:
+            return a.node < b.node
+        return self.path() < other.path()
+
+def regle_anti_boucle(label, passages, logiques, prev_station, succ_station, succ_logique, succ_line,
+                      max_visites_station=2):
+    """
+    Filtre anti-boucle commun aux recherches (compiled_path_solver, pareto, route_tree) pour
+    l'arête label -> succ ; passages et logiques : label.loop_state(), prev_station : station
+    du parent. Retourne le numéro de la règle violée (1 à 4), 0 si l'arête est permise.
+    """
+    # 1. Pas plus de max_visites_station passages par station (toutes lignes confondues)
+    if passages.get(succ_station, 0) >= max_visites_station:
+        return 1
+    # 2. Interdit de repasser sur même station avec même ligne logique
+    if (succ_station, succ_logique) in logiques:
+        return 2
+    # 3. Interdit triple passage d'affilée même station
+    if succ_station == label.station == prev_station:
+        return 3
+    # 4. Interdit "changement de ligne logique" sans changement effectif (ex : RER C 1 → RER C 2)
+    if label.station == succ_station and label.logique == succ_logique and succ_line != label.ligne:
+        return 4
+    return 0
+
+class SolverStats:
+    """
+    Compteurs d'une recherche (compiled_path_solver(stats=...)) :
+      - pushes / pops / tas_max : opérations et taille maximale du tas
+      - domines : étiquettes écartées au dépilement (visited, ou quota d'expansions en mode k routes)
+      - regles : étiquettes écartées par chaque règle anti-boucle (1 à 4)
+      - finales : routes finies collectées
+      - phases : durée en ms de chaque phase (init, recherche, dedup, resultats)
+      - source : "recherche", "cache" ou "table" (réponses de find_best_route)
+      - recherche : bilan de la recherche (même contenu que result["recherche"]), renseigné même
+                    quand aucune route n'est trouvée
+    """
+
+    def __init__(self):
+        self.source = "recherche"
+        self.pushes = 0
+        self.pops = 0
+        self.tas_max = 0
+        self.domines = 0
+        self.regles = {1: 0, 2: 0, 3: 0, 4: 0}
+        self.finales = 0
+        self.phases = {}
+        self.recherche = None
 
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "pushes": self.pushes,
+            "pops": self.pops,
+            "tas_max": self.tas_max,
+            "domines": self.domines,
+            "regles": dict(self.regles),
+            "finales": self.finales,
+            "phases": dict(self.phases),
+            "recherche": dict(self.recherche) if self.recherche is not None else None,
+        }
+
+    def __str__(self):
+        lines = [
+            f"Source                  : {self.source}",
+            f"Pushes / pops           : {self.pushes} / {self.pops}",
+            f"Taille max du tas       : {self.tas_max}",
+            f"Etiquettes dominées     : {self.domines}",
+            "Rejets anti-boucle      : " + ", ".join(f"règle {r} = {n}" for r, n in sorted(self.regles.items())),
+            f"Routes finies           : {self.finales}",
+        ]
+        if self.phases:
+            lines.append("Phases (ms)             : " + ", ".join(f"{k} {v:.2f}" for k, v in self.phases.items()))
+        if self.recherche is not None:
+            r = self.recherche
+            lines.append(f"Recherche               : mode {r['mode']}, arrêt {r['arret']}, "
+                         f"{'terminée' if r['termine'] else 'non terminée'}, {r['beam_ecartees']} écartées par le faisceau")
+        return "\n".join(lines)
+
+def curseur_weights(curseur):
+    """
+    Pondérations (alpha: arrêts, beta: affluence moyenne, gamma: changement de ligne) du curseur.
+    """
     if curseur == 1:
         alpha = 3.5
         beta  = 0.01
@@ -32,132 +187,477 @@ def blob_path_solver(
         alpha = max(0.01, 1.5 - 0.16*curseur)
         beta  = 0.05 + 1.7 * ((curseur-1)/9)**2.1
         gamma = max(0.01, 1.0 - 0.11*curseur)
+    return alpha, beta, gamma
+
+def blob_path_solver(
+    G,
+    affluence_mapping,
+    nodes_depart,
+    nodes_arrivee,
+    curseur=1,
+    verbose=False,
+    max_iter=25000,
+    max_visites_station=2,
+    topk=10,
+    return_all_explored=False,
+    astar=False,
+    k_routes=None,
+    diversite_min=0.0,
+    labels_par_noeud=None,
+    deadline_ms=None,
+    beam_width=None,
+    beam_par_noeud=False,
+    stats=None,
+    sink=None,
+    horaire=None,
+    pas_min=15
+):
+    """
+    Version NetworkX : compile le graphe (une fois par graphe) et délègue à compiled_path_solver.
+    Les noeuds de départ/arrivée et les chemins renvoyés sont des identifiants NetworkX.
+    """
+    net = compile_network(G)
+    affluence = net.affluence_vector(affluence_mapping)
+    return compiled_path_solver(
+        net,
+        affluence,
+        [net.node_index[n] for n in nodes_depart],
+        [net.node_index[n] for n in nodes_arrivee],
+        curseur=curseur,
+        verbose=verbose,
+        max_iter=max_iter,
+        max_visites_station=max_visites_station,
+        topk=topk,
+        return_all_explored=return_all_explored,
+        astar=astar,
+        k_routes=k_routes,
+        diversite_min=diversite_min,
+        labels_par_noeud=labels_par_noeud,
+        deadline_ms=deadline_ms,
+        beam_width=beam_width,
+        beam_par_noeud=beam_par_noeud,
+        stats=stats,
+        sink=sink,
+        horaire=horaire,
+        pas_min=pas_min
+    )
+
+def route_diversity(pairs, other_pairs):
+    """
+    Part des couples (station, ligne logique) d'une route absents d'une autre route.
+    """
+    return len(pairs - other_pairs) / len(pairs)
+
+def compiled_path_solver(
+    net,
+    affluence,
+    nodes_depart,
+    nodes_arrivee,
+    curseur=1,
+    verbose=False,
+    max_iter=25000,
+    max_visites_station=2,
+    topk=10,
+    return_all_explored=False,
+    astar=False,
+    k_routes=None,
+    diversite_min=0.0,
+    labels_par_noeud=None,
+    chain_skip=None,
+    deadline_ms=None,
+    beam_width=None,
+    beam_par_noeud=False,
+    stats=None,
+    sink=None,
+    horaire=None,
+    pas_min=15
+):
+    """
+    Recherche Blob sur un CompiledNetwork.
+    affluence : vecteur dense par noeud (CompiledNetwork.affluence_vector).
+    nodes_depart / nodes_arrivee : identifiants entiers des noeuds.
+    astar : ordonne le tas par score + alpha * (arrêts restants minimum jusqu'à l'arrivée),
+            et ignore les noeuds d'où l'arrivée est injoignable.
+    k_routes : si renseigné, recherche à k étiquettes par noeud (labels_par_noeud, k par défaut)
+               qui s'arrête dès que k routes distinctes sont trouvées, au lieu de collecter
+               topk * 5 routes finies. Une route n'est retenue que si au moins diversite_min
+               de ses couples (station, ligne logique) sont absents de chaque route déjà retenue.
+    chain_skip : ChainSkip du réseau (graph_builder/chain_skip.py) ; un noeud intermédiaire
+                 (chaîne de stations sans correspondance) est développé vers son seul successeur
+                 possible, sans parcourir ses arêtes ni recopier l'état anti-boucle, et son enfant
+                 est poussé et dépilé en une opération. Mêmes étiquettes dépilées dans le même
+                 ordre que sans : routes identiques.
+    deadline_ms : mode "anytime", la recherche s'arrête à l'échéance et renvoie les meilleures
+                  routes trouvées jusque-là.
+    beam_width : mode faisceau, au plus beam_width étiquettes en attente dans la frontière par
+                 profondeur (ou par noeud avec beam_par_noeud) : les beam_width meilleures (clé du tas).
+                 Une étiquette qui arrive sur une tranche pleine prend la place de la pire étiquette
+                 en attente si elle est meilleure, sinon elle est écartée ; une place se libère quand
+                 une étiquette est dépilée. La frontière reste bornée, au prix de l'optimalité
+                 (recherche non terminée dès qu'une étiquette a été écartée).
+    Chaque route renvoyée porte result["recherche"] : mode, recherche terminée ou non, cause de
+    l'arrêt, itérations, taille de la frontière restante, étiquettes écartées par le faisceau, durée.
+    stats : SolverStats à remplir (compteurs et durées par phase, et stats.recherche, y compris
+            sans route trouvée), optionnel.
+    sink : récepteur des étiquettes dépilées (blobia/explore_sink.py), appelé au fil de la recherche.
+    return_all_explored : retourne aussi la liste de toutes les étiquettes dépilées (ExploredListSink).
+    horaire : mode horaire, table [créneaux, n_noeuds] (affluence_builder.affluence_tensor.affluence_timeline) :
+              chaque étiquette porte l'heure d'arrivée estimée (CompiledNetwork.travel_minutes) et chaque
+              arrêt est pris à l'affluence du créneau de pas_min minutes où on y arrive (affluence
+              est alors ignoré). Chaque route renvoyée porte result["duree_min"].
+    """
+    t_start = time.perf_counter()
+    deadline = t_start + deadline_ms / 1000.0 if deadline_ms is not None else None
+    alpha, beta, gamma = curseur_weights(curseur)
+
+    successors = net.successors
+    station_of = net.station_of
+    line_of = net.line_of
+    logical_of = net.logical_of
+    # -- Mode horaire : affluence lue par (créneau d'arrivée, noeud), un simple double index --
+    if horaire is not None:
+        rows = horaire.tolist() if hasattr(horaire, "tolist") else [list(r) for r in horaire]
+        last_row = len(rows) - 1
+        par_min = 1.0 / pas_min
+        travel = net.travel_minutes().tolist()  # minutes par arête, positions offsets[noeud] + j
+        offsets = net.offsets
+        affluence = rows[0]
+    else:
+        rows = None
+    affluence = affluence.tolist() if hasattr(affluence, "tolist") else list(affluence)
+    is_arrivee = [False] * net.n_nodes
+    for n in nodes_arrivee:
+        is_arrivee[n] = True
+
+    # -- Chaînes : voisins de ligne de chaque noeud intermédiaire (None pour les autres) --
+    next_hops = chain_skip.next_hops if chain_skip is not None else None
+
+    # -- Faisceau : étiquettes en attente dans la frontière, par profondeur ou par noeud --
+    beam = {} if beam_width is not None else None
+    beam_ecartees = 0
+    if beam is not None:
+        beam_tas = {}         # par tranche : tas max (clé négée) des étiquettes en attente, entrées périmées comprises
+        en_attente = set()    # étiquettes en attente comptées dans le faisceau
+        ordre_beam = itertools.count()
+
+        def beam_place(slot, key, lab):
+            # Place dans la tranche : libre, ou prise à la pire étiquette en attente si lab est meilleure
+            nonlocal beam_ecartees
+            tas = beam_tas.get(slot)
+            if tas is None:
+                tas = beam_tas[slot] = []
+            if beam.get(slot, 0) >= beam_width:
+                while tas and tas[0][2] not in en_attente:
+                    heapq.heappop(tas)
+                beam_ecartees += 1
+                if not tas or -tas[0][0] <= key:
+                    return False
+                en_attente.discard(heapq.heappop(tas)[2])
+            else:
+                beam[slot] = beam.get(slot, 0) + 1
+                if len(tas) > 2 * beam_width:
+                    tas[:] = [e for e in tas if e[2] in en_attente]
+                    heapq.heapify(tas)
+            heapq.heappush(tas, (-key, next(ordre_beam), lab))
+            en_attente.add(lab)
+            return True
+
+    modes = [m for m, actif in (("deadline", deadline is not None), ("beam", beam is not None)) if actif]
+
+    # -- Aucune arrivée atteignable depuis le départ : réponse immédiate --
+    if not net.reachable(nodes_depart, nodes_arrivee):
+        if stats is not None:
+            stats.phases["init"] = (time.perf_counter() - t_start) * 1000.0
+            stats.recherche = {
+                "mode": "+".join(modes) or "complet", "termine": True, "arret": "injoignable", "iterations": 0,
+                "frontiere": 0, "beam_ecartees": 0, "duree_ms": (time.perf_counter() - t_start) * 1000.0,
+            }
+        return ([], []) if return_all_explored else []
+
+    # -- Mode A* : borne inférieure sur les arrêts restants (BFS inverse depuis l'arrivée) --
+    hops = net.hops_to(nodes_arrivee) if astar else None
 
     front = []
     heapq.heapify(front)
     for dep in nodes_depart:
-        data = G.nodes[dep]
         score_init = 0.0
-        aff_init = affluence_mapping.get((data['station_key'], data['ligne']), 0.2)
-        visits = defaultdict(int)
-        visits[G.nodes[dep]['station_key']] = 1
-        heapq.heappush(front, (score_init, dep, [dep], [aff_init], [data['ligne']], visits))
+        key_init = score_init + alpha * hops[dep] if astar else score_init
+        label = Label(None, dep, line_of[dep], affluence[dep], station_of[dep], logical_of[dep], score_init)
+        if beam is not None and not beam_place(dep if beam_par_noeud else 1, key_init, label):
+            continue
+        heapq.heappush(front, (key_init, dep, label))
 
-    visited = dict()
+    visited = [INF] * net.n_nodes
     finals = []
-    explored_paths = []
+    if return_all_explored:
+        explored = ExploredListSink(net)
+        sink = TeeSink(explored, sink) if sink is not None else explored
+
+    # -- Mode k routes : nombre d'expansions par noeud borné, routes acceptées au fil de l'eau --
+    k_mode = k_routes is not None
+    if k_mode:
+        if labels_par_noeud is None:
+            labels_par_noeud = k_routes
+        expansions = [0] * net.n_nodes
+        seen_routes = set()
+        accepted_pairs = []
+        max_finals = k_routes
+    else:
+        max_finals = topk * 5
+
+    # -- Compteurs (SolverStats) --
+    pushes = len(front)
+    tas_max = len(front)
+    domines = 0
+    rejets = [0] * 5  # étiquettes écartées par chaque règle anti-boucle (indices 1 à 4)
+    t_search = time.perf_counter()
 
     it = 0
-    while front and it < max_iter and len(finals) < topk * 5:
+    interrompu = False
+    suivant = None  # entrée déjà sortie du tas (heappushpop d'un noeud intermédiaire)
+    while (front or suivant is not None) and it < max_iter and len(finals) < max_finals:
+        # -- Mode anytime : échéance vérifiée toutes les 64 itérations --
+        if deadline is not None and not it & 63 and time.perf_counter() >= deadline:
+            interrompu = True
+            break
+        if suivant is not None:
+            _, node, label = suivant
+            suivant = None
+        else:
+            _, node, label = heapq.heappop(front)
+        if beam is not None:
+            if label not in en_attente:
+                continue  # évincée du faisceau par une meilleure étiquette (ni itération, ni dépilement)
+            en_attente.discard(label)
+            beam[node if beam_par_noeud else label.depth] -= 1
         it += 1
-        score, node, path, affluences, lignes, visits = heapq.heappop(front)
-        visits = visits.copy()
-        visits[G.nodes[node]['station_key']] += 1
-
-        if return_all_explored:
-            explored_paths.append({
-                "score": score,
-                "raw_path": list(path),
-                "affluences": list(affluences),
-                "lignes": list(lignes)
-            })
-
-        if node in nodes_arrivee:
-            finals.append((score, node, path, affluences, lignes))
-            continue
+        score = label.score
 
-        key = (node, lignes[-1])
-        if key in visited and visited[key] <= score:
-            continue
-        visited[key] = score
+        if sink is not None:
+            sink.on_pop(label, is_arrivee[node])
 
-        for succ in G.neighbors(node):
-            succ_line = G.nodes[succ]['ligne']
-            succ_aff = affluence_mapping.get((G.nodes[succ]['station_key'], succ_line), 0.2)
-            succ_station = G.nodes[succ]['station_key']
-
-            # ------------- FILTRE ANTI-BOUCLE -----------------
-            potential_path = path + [succ]
-            stations_logiques = [(G.nodes[n]['station_key'], normalize_line(G.nodes[n]['ligne'])) for n in potential_path]
+        if is_arrivee[node]:
+            if k_mode:
+                path = label.path()
+                seq = tuple([station_of[n] for n in path])
+                if seq in seen_routes:
+                    continue
+                seen_routes.add(seq)
+                pairs = {(station_of[n], logical_of[n]) for n in path}
+                # Routes déjà retenues trop proches de celle-ci : on garde la meilleure (le score
+                # n'étant pas monotone le long du chemin, une route plus tardive peut être meilleure)
+                proches = [i for i, other in enumerate(accepted_pairs) if route_diversity(pairs, other) < diversite_min]
+                if any(finals[i][0] <= score for i in proches):
+                    continue
+                for i in reversed(proches):
+                    del finals[i]
+                    del accepted_pairs[i]
+                accepted_pairs.append(pairs)
+            finals.append((score, node, label))
+            continue
 
-            # 1. Pas plus de 2 passages par station (toutes lignes confondues)
-            if [G.nodes[n]['station_key'] for n in potential_path].count(succ_station) > 2:
+        if k_mode:
+            if expansions[node] >= labels_par_noeud:
+                domines += 1
                 continue
-
-            # 2. Interdit de repasser sur même station avec même ligne logique
-            if stations_logiques.count((succ_station, normalize_line(succ_line))) > 1:
+            expansions[node] += 1
+        else:
+            # Une ligne par noeud : la clé (noeud, ligne) se réduit au noeud
+            if visited[node] <= score:
+                domines += 1
                 continue
+            visited[node] = score
 
-            # 3. Interdit triple passage d'affilée même station
-            if len(potential_path) >= 3:
-                if (G.nodes[potential_path[-1]]['station_key'] == G.nodes[potential_path[-2]]['station_key'] == G.nodes[potential_path[-3]]['station_key']):
+        if next_hops is not None and next_hops[node] is not None and label.parent is not None:
+            # -- Noeud intermédiaire (chain_skip) : le seul successeur possible est le voisin de ligne
+            # qui n'est pas le précédent (retour en arrière refusé par la règle 2, autres arêtes par
+            # les règles 2 et 4). Etiquette poussée comme sans chain_skip : même ordre de dépilement.
+            a, b = next_hops[node]
+            prev = label.parent.node
+            succ = b if prev == a else a if prev == b else -1
+            if succ >= 0:
+                succ_station = station_of[succ]
+                succ_logique = logical_of[succ]
+                # Règles 1 et 2 : état anti-boucle du dernier ancêtre développé hors chaîne, complété
+                # par les arrêts de la chaîne depuis (sans copie) ; les règles 3 et 4 ne portent que
+                # sur des arêtes internes à une station
+                n_passages = 0
+                deja_vu = False
+                anc = label
+                while anc.passages is None:
+                    if anc.station == succ_station:
+                        n_passages += 1
+                        deja_vu = deja_vu or anc.logique == succ_logique
+                    anc = anc.parent
+                if anc.passages.get(succ_station, 0) + n_passages >= max_visites_station:
+                    rejets[1] += 1
                     continue
-
-            # 4. Interdit "changement de ligne logique" sans changement effectif (ex : RER C 1 → RER C 2)
-            if len(path) >= 1:
-                last_station = G.nodes[path[-1]]['station_key']
-                last_logique = normalize_line(G.nodes[path[-1]]['ligne'])
-                if last_station == succ_station and last_logique == normalize_line(succ_line) and succ_line != lignes[-1]:
+                if deja_vu or (succ_station, succ_logique) in anc.logiques:
+                    rejets[2] += 1
+                    continue
+                succ_line = line_of[succ]
+                if rows is None:
+                    succ_aff = affluence[succ]
+                    succ_min = 0.0
+                else:
+                    succ_min = label.minutes + travel[offsets[node] + successors[node].index(succ)]
+                    k = int(succ_min * par_min)
+                    succ_aff = rows[k if k < last_row else last_row][succ]
+                penalty = 0.0
+                if succ_line != label.ligne:
+                    penalty += gamma
+                new_score = (
+                    alpha * (label.depth + 1) +
+                    beta * ((label.aff_sum + succ_aff) / (label.depth + 1)) +
+                    penalty
+                )
+                new_key = new_score
+                if astar:
+                    if hops[succ] == INF:
+                        continue
+                    new_key += alpha * hops[succ]
+                succ_label = Label(label, succ, succ_line, succ_aff, succ_station, succ_logique, new_score, succ_min)
+                if beam is not None and not beam_place(succ if beam_par_noeud else label.depth + 1, new_key, succ_label):
                     continue
-            # ------------- FIN FILTRE ANTI-BOUCLE --------------
+                # Seul enfant : poussé et dépilé en une opération (lui-même s'il est le plus petit)
+                suivant = heapq.heappushpop(front, (new_key, succ, succ_label))
+                pushes += 1
+                if len(front) + 1 > tas_max:
+                    tas_max = len(front) + 1
+                continue
+
+        passages, logiques = label.loop_state()
+        prev_station = label.parent.station if label.parent is not None else None
+
+        if rows is not None:
+            arete = offsets[node] - 1
+        for succ in successors[node]:
+            succ_station = station_of[succ]
+            succ_line = line_of[succ]
+            succ_logique = logical_of[succ]
+            if rows is None:
+                succ_aff = affluence[succ]
+                succ_min = 0.0
+            else:
+                arete += 1
+                succ_min = label.minutes + travel[arete]
+                k = int(succ_min * par_min)
+                succ_aff = rows[k if k < last_row else last_row][succ]
+
+            regle = regle_anti_boucle(label, passages, logiques, prev_station, succ_station, succ_logique,
+                                      succ_line, max_visites_station)
+            if regle:
+                rejets[regle] += 1
+                continue
 
             penalty = 0.0
-            if succ_line != lignes[-1]:
+            if succ_line != label.ligne:
                 penalty += gamma
-            nb_arrets = len(path)
-            aff_moy = (sum(affluences) + succ_aff) / (len(affluences) + 1)
+            nb_arrets = label.depth
+            aff_moy = (label.aff_sum + succ_aff) / (label.depth + 1)
             new_score = (
                 alpha * (nb_arrets + 1) +
                 beta * aff_moy +
                 penalty
             )
-            heapq.heappush(front, (
-                new_score,
-                succ,
-                path + [succ],
-                affluences + [succ_aff],
-                lignes + [succ_line],
-                visits
-            ))
-
-    def stations_sequence(path):
-        return tuple([G.nodes[n]['station_key'] for n in path])
+            new_key = new_score
+            if astar:
+                if hops[succ] == INF:
+                    continue
+                new_key += alpha * hops[succ]
+            succ_label = Label(label, succ, succ_line, succ_aff, succ_station, succ_logique, new_score, succ_min)
+            if beam is not None and not beam_place(succ if beam_par_noeud else label.depth + 1, new_key, succ_label):
+                continue
+            heapq.heappush(front, (new_key, succ, succ_label))
+            pushes += 1
+        if len(front) > tas_max:
+            tas_max = len(front)
+
+    if suivant is not None:
+        heapq.heappush(front, suivant)
 
+    t_dedup = time.perf_counter()
     unique_routes = {}
-    for tup in sorted(finals, key=lambda x: x[0]):
-        seq = stations_sequence(tup[2])
+    for score, node, label in sorted(finals, key=lambda x: x[0]):
+        path, affluences, lignes = label.unwind()
+        seq = tuple([station_of[n] for n in path])
         if seq not in unique_routes:
-            unique_routes[seq] = tup
+            unique_routes[seq] = (score, node, path, affluences, lignes, label.minutes)
 
-    top_routes = list(unique_routes.values())[:3]
+    top_routes = list(unique_routes.values())
+    if not k_mode:
+        top_routes = top_routes[:3]
+
+    t_results = time.perf_counter()
+    restantes = len(en_attente) if beam is not None else len(front)  # sans les étiquettes évincées
+    if interrompu:
+        arret = "deadline"
+    elif len(finals) >= max_finals:
+        arret = "routes"
+    elif restantes:
+        arret = "max_iter"
+    else:
+        arret = "frontiere_vide"
+    recherche = {
+        "mode": "+".join(modes) or "complet",
+        # Une étiquette écartée par le faisceau a pu manquer une meilleure route
+        "termine": arret in ("routes", "frontiere_vide") and beam_ecartees == 0,
+        "arret": arret,
+        "iterations": it,
+        "frontiere": restantes,
+        "beam_ecartees": beam_ecartees,
+        "duree_ms": (time.perf_counter() - t_start) * 1000.0,
+    }
 
     results = []
-    for score, node, path, affluences, lignes in top_routes:
-        stations = [G.nodes[n]['name'] for n in path]
-        lignes_aff = [normalize_line(G.nodes[n]['ligne']) for n in path]
-        aff_moy = sum(affluences) / len(affluences)
-        aff_max = max(affluences)
-        stations_aff_max = [stations[i] for i, aff in enumerate(affluences) if aff == aff_max]
-        changements = [i for i in range(1, len(lignes_aff)) if lignes_aff[i] != lignes_aff[i-1]]
-        nb_changements = len(changements)
-        path_keys = [(G.nodes[n]['station_key'], lignes_aff[i]) for i, n in enumerate(path)]
-        results.append({
-            "path": path_keys,
-            "score": score,
-            "nb_stations": len(path),
-            "nb_changements": nb_changements,
-            "changements": changements,
-            "affluence_moyenne": aff_moy,
-            "affluence_max": aff_max,
-            "stations_affluence_max": stations_aff_max,
-            "raw_path": path,
-            "raw_lignes": lignes_aff,
-        })
+    for score, node, path, affluences, lignes, minutes in top_routes:
+        result = build_result(net, score, path, affluences)
+        result["recherche"] = dict(recherche)
+        if rows is not None:
+            result["duree_min"] = minutes
+        results.append(result)
+
+    if stats is not None:
+        stats.recherche = dict(recherche)
+        stats.pushes += pushes
+        stats.pops += it
+        stats.tas_max = max(stats.tas_max, tas_max)
+        stats.domines += domines
+        for regle in stats.regles:
+            stats.regles[regle] += rejets[regle]
+        stats.finales += len(finals)
+        t_end = time.perf_counter()
+        stats.phases["init"] = (t_search - t_start) * 1000.0
+        stats.phases["recherche"] = (t_dedup - t_search) * 1000.0
+        stats.phases["dedup"] = (t_results - t_dedup) * 1000.0
+        stats.phases["resultats"] = (t_end - t_results) * 1000.0
 
     if return_all_explored:
-        for r in explored_paths:
-            if "raw_path" not in r:
-                r["raw_path"] = r.get("path", None)
-        return results, explored_paths
+        return results, explored.routes
     else:
         return results
+
+def build_result(net, score, path, affluences):
+    """
+    Dictionnaire résultat d'une route (chemin en identifiants entiers).
+    """
+    stations = [net.display_names[n] for n in path]
+    lignes_aff = [net.logical_names[net.logical_of[n]] for n in path]
+    aff_moy = sum(affluences) / len(affluences)
+    aff_max = max(affluences)
+    stations_aff_max = [stations[i] for i, aff in enumerate(affluences) if aff == aff_max]
+    changements = [i for i in range(1, len(lignes_aff)) if lignes_aff[i] != lignes_aff[i-1]]
+    nb_changements = len(changements)
+    path_keys = [(net.station_names[net.station_of[n]], lignes_aff[i]) for i, n in enumerate(path)]
+    return {
+        "path": path_keys,
+        "score": score,
+        "nb_stations": len(path),
+        "nb_changements": nb_changements,
+        "changements": changements,
+        "affluence_moyenne": aff_moy,
+        "affluence_max": aff_max,
+        "stations_affluence_max": stations_aff_max,
+        "raw_path": [net.node_names[n] for n in path],
+        "raw_lignes": lignes_aff,
+    }
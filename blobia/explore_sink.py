@@ -0,0 +1,160 @@
+import random
+import numpy as np
+
+# -- Récepteurs d'exploration --
+# compiled_path_solver(sink=...) appelle sink.on_pop(label, final) à chaque étiquette dépilée,
+# au fil de la recherche : rien n'est accumulé par le solver lui-même.
+# Les étiquettes partagent leurs ancêtres : garder une étiquette coûte un pointeur, pas un chemin.
+
+def explored_route(net, label, final):
+    """
+    Dictionnaire d'une étiquette explorée (chemin en identifiants NetworkX).
+    """
+    path, affluences, lignes = label.unwind()
+    return {
+        "score": label.score,
+        "raw_path": [net.node_names[n] for n in path],
+        "affluences": affluences,
+        "lignes": [net.line_names[l] for l in lignes],
+        "final": final,
+    }
+
+class ExploredListSink:
+    """
+    Toutes les étiquettes dépilées, converties en dictionnaires (ancien return_all_explored).
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.routes = []
+
+    def on_pop(self, label, final):
+        self.routes.append(explored_route(self.net, label, final))
+
+class TeeSink:
+    """
+    Transmet chaque événement à plusieurs récepteurs.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def on_pop(self, label, final):
+        for sink in self.sinks:
+            sink.on_pop(label, final)
+
+class ReservoirSink:
+    """
+    Echantillon uniforme de k étiquettes dépilées (échantillonnage par réservoir) :
+    mémoire bornée quel que soit le nombre d'itérations.
+    """
+
+    def __init__(self, k=1000, seed=None):
+        self.k = k
+        self.seen = 0
+        self.sample = []
+        self._rng = random.Random(seed)
+
+    def on_pop(self, label, final):
+        self.seen += 1
+        if len(self.sample) < self.k:
+            self.sample.append((label, final))
+        else:
+            i = self._rng.randrange(self.seen)
+            if i < self.k:
+                self.sample[i] = (label, final)
+
+    def routes(self, net):
+        return [explored_route(net, label, final) for label, final in self.sample]
+
+class EdgeFrequencySink:
+    """
+    Nombre de passages de la recherche sur chaque arête (u, v) (identifiants entiers),
+    compté à chaque étiquette dépilée.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def on_pop(self, label, final):
+        if label.parent is not None:
+            edge = (label.parent.node, label.node)
+            self.counts[edge] = self.counts.get(edge, 0) + 1
+
+    def named_counts(self, net):
+        names = net.node_names
+        return {(names[u], names[v]): c for (u, v), c in self.counts.items()}
+
+TRACE_DTYPE = np.dtype([
+    ("parent", "<i4"),   # indice de l'événement du parent dépilé (-1 : départ)
+    ("node", "<i4"),     # noeud (identifiant entier du CompiledNetwork)
+    ("depth", "<u2"),    # nombre d'arrêts du chemin
+    ("score", "<f4"),
+    ("final", "u1"),
+], align=False)
+
+class BinaryTraceSink:
+    """
+    Trace binaire compacte (TRACE_DTYPE, 15 octets par étiquette dépilée), écrite par blocs.
+    Chaque événement pointe vers l'événement de son plus proche ancêtre dépilé : les chemins
+    se reconstruisent depuis le fichier (read_trace / trace_path).
+    L'indice de l'événement est gardé sur l'étiquette (Label.trace_id) : la trace ne retient
+    aucune étiquette. Une seule trace binaire par recherche.
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self._file = open(path, "wb")
+        self._buffer = np.zeros(buffer_size, dtype=TRACE_DTYPE)
+        self._n = 0
+        self.count = 0
+
+    def on_pop(self, label, final):
+        ancestor = label.parent
+        while ancestor is not None and ancestor.trace_id < 0:
+            ancestor = ancestor.parent
+        self._buffer[self._n] = (
+            ancestor.trace_id if ancestor is not None else -1,
+            label.node,
+            label.depth,
+            label.score,
+            final,
+        )
+        label.trace_id = self.count
+        self.count += 1
+        self._n += 1
+        if self._n == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self._buffer[:self._n].tofile(self._file)
+        self._n = 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_trace(path):
+    """
+    Trace écrite par BinaryTraceSink, en memory-map (tableau structuré TRACE_DTYPE).
+    """
+    return np.memmap(path, dtype=TRACE_DTYPE, mode="r")
+
+def trace_path(trace, event):
+    """
+    Noeuds dépilés du départ jusqu'à l'événement.
+    """
+    path = []
+    while event >= 0:
+        path.append(int(trace[event]["node"]))
+        event = int(trace[event]["parent"])
+    path.reverse()
+    return path
@@ -1,13 +1,7 @@
 import pandas as pd
 from geopy.distance import geodesic
-import unidecode
-
-def normalize_name(name):
-    if not isinstance(name, str):
-        return ""
-    name = unidecode.unidecode(name).lower().replace("-", " ")
-    name = name.replace("’", "'").replace("`", "'").replace("–", " ")
-    return " ".join(name.split()).strip()
+from blobia.tables import read_table
+from blobia.names import normalize_name, normalize_names
 
 def find_stations_near_monument(
         monument_name,
@@ -17,7 +11,7 @@ def find_stations_near_monument(
     ):
     # Charger monuments (attention aux noms de colonnes !)
     monuments = pd.read_csv(monuments_csv, encoding='cp1252')
-    monuments["monument_norm"] = monuments["Monument"].apply(normalize_name)
+    monuments["monument_norm"] = normalize_names(monuments["Monument"])
     monument_norm = normalize_name(monument_name)
     row = monuments[monuments["monument_norm"] == monument_norm]
     if row.empty:
@@ -25,8 +19,8 @@ def find_stations_near_monument(
     lat_m, lon_m = float(row.iloc[0]["Latitude"]), float(row.iloc[0]["Longitude"])
 
     # Charger stations
-    stations = pd.read_csv(stations_csv)
-    stations["station_key"] = stations["gare_key"].apply(normalize_name)
+    stations = read_table(stations_csv, columns=["gare_key", "latitude", "longitude"])
+    stations["station_key"] = normalize_names(stations["gare_key"])
     stations = stations.drop_duplicates("station_key")
     stations = stations.dropna(subset=["latitude", "longitude"])
 
@@ -44,6 +38,40 @@ def find_stations_near_monument(
     results = sorted(results, key=lambda x: x[1])
     return results
 
+def arrival_nodes_near_monument(
+        net,
+        monument_name,
+        rayon_m=900,
+        monuments_csv="data/monuments.csv",
+        stations_csv="data/graph_nodes.csv"
+    ):
+    """
+    Stations et noeuds d'arrivée d'un monument (même filtrage que main.py) :
+    pour chaque ligne, on ne garde que la station proche la plus près du monument,
+    puis les noeuds du réseau dont la station et la ligne font partie de la sélection.
+    Retourne (arr_station_keys, arr_node_ids).
+    """
+    arr_candidates = find_stations_near_monument(
+        monument_name,
+        rayon_m=rayon_m,
+        monuments_csv=monuments_csv,
+        stations_csv=stations_csv
+    )
+    line_to_station = dict()  # {ligne: (station_key, distance)}
+    for st, dist in arr_candidates:
+        st = normalize_name(st)
+        for n in net.nodes_of_station(st):
+            line = net.line_names[net.line_of[n]]
+            if (line not in line_to_station) or (dist < line_to_station[line][1]):
+                line_to_station[line] = (st, dist)
+    arr_station_keys = [s for s, _ in line_to_station.values()]
+    arr_lines = set(line_to_station.keys())
+    arr_node_ids = [
+        n for s in dict.fromkeys(arr_station_keys) for n in net.nodes_of_station(s)
+        if net.line_names[net.line_of[n]] in arr_lines
+    ]
+    return arr_station_keys, arr_node_ids
+
 if __name__ == "__main__":
     stations = find_stations_near_monument("Tour Eiffel", rayon_m=600)
     print("Stations proches :", stations)
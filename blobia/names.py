@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import unidecode
+
+# -- Normalisation des noms de stations (clés de jointure de tout le projet) --
+# "Gare-de-l’Est " -> "gare de l'est" : translittération ASCII, minuscules, tirets et tirets
+# demi-cadratin en espaces, apostrophes typographiques en "'", espaces regroupés.
+# Une valeur manquante (None, NaN) donne "".
+
+_SEPARATEUR = "\0"  # inchangé par unidecode, jamais dans un nom
+_ESPACES = re.compile(r"\s+")
+_BORDS = re.compile(r" ?\0 ?")
+
+def _normalize_text(text):
+    text = unidecode.unidecode(text).lower()
+    text = text.replace("-", " ").replace("’", "'").replace("`", "'").replace("–", " ")
+    return _ESPACES.sub(" ", text)
+
+@lru_cache(maxsize=65536)
+def _normalize_cached(text):
+    return _normalize_text(text).strip()
+
+def normalize_name(name):
+    """
+    Nom normalisé d'une station (mémoïsé : chaque nom distinct n'est calculé qu'une fois).
+    """
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    return _normalize_cached(str(name))
+
+def normalize_names(values):
+    """
+    Version vectorisée pour une Series (ou une liste) : les valeurs distinctes sont normalisées
+    en une seule passe (un appel à unidecode pour toute la colonne), puis redistribuées.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    codes, uniques = pd.factorize(series)
+    texts = [str(v) for v in uniques]
+    if any(_SEPARATEUR in t for t in texts):
+        normalized = [_normalize_cached(t) for t in texts]
+    else:
+        joined = _BORDS.sub(_SEPARATEUR, _normalize_text(_SEPARATEUR.join(texts)).strip())
+        normalized = joined.split(_SEPARATEUR) if texts else []
+    out = np.array(normalized + [""], dtype=object)[codes]  # code -1 (valeur manquante) -> ""
+    return pd.Series(out, index=series.index, name=series.name)
@@ -0,0 +1,327 @@
+import os
+import json
+import pickle
+import hashlib
+import weakref
+from collections import OrderedDict, deque
+import numpy as np
+
+def normalize_line(line):
+    parts = str(line).upper().split()
+    if parts[0] in {"RER", "METRO"} and len(parts) > 1:
+        return f"{parts[0]} {parts[1]}"
+    return str(line).upper()
+
+# -- Temps de parcours estimés (mode horaire du solver) --
+VITESSE_KMH = {"METRO": 25.0, "RER": 45.0}  # vitesse commerciale par famille de ligne
+VITESSE_DEFAUT_KMH = 30.0
+ARRET_MIN = 0.5            # temps d'arrêt en station
+INTERSTATION_MIN = 2.0     # inter-station sans distance connue (estimation au nombre d'arrêts)
+CORRESPONDANCE_MIN = 4.0   # changement de ligne dans une même station
+
+def _intern(values):
+    """
+    Retourne (ids, table) : un identifiant entier par valeur + la table des valeurs distinctes.
+    """
+    table = []
+    index = {}
+    ids = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        k = index.get(v)
+        if k is None:
+            k = index[v] = len(table)
+            table.append(v)
+        ids[i] = k
+    return ids, table
+
+class CompiledNetwork:
+    """
+    Réseau indexé par entiers, construit une seule fois à partir du graphe NetworkX :
+      - adjacence CSR (indptr / indices)
+      - identifiants internés de station, de ligne et de ligne logique (normalize_line)
+      - coordonnées des noeuds, distance de chaque arête (alignée sur indices)
+    Les noeuds sont numérotés dans l'ordre trié de leurs identifiants NetworkX, pour que
+    l'ordre des entiers reproduise l'ordre des chaînes (départage du tas du solver).
+    """
+
+    # Tableaux NumPy et tables de noms qui suffisent à reconstruire le réseau (from_arrays)
+    ARRAYS = ("station_ids", "line_ids", "logical_ids", "latitude", "longitude", "indptr", "indices", "distance")
+    TABLES = ("node_names", "station_names", "line_names", "logical_names", "display_names")
+
+    def __init__(self, node_names, node_attrs, edges, distances=None):
+        self.node_names = list(node_names)
+        n_nodes = len(self.node_names)
+
+        self.station_ids, self.station_names = _intern([a['station_key'] for a in node_attrs])
+        self.line_ids, self.line_names = _intern([a['ligne'] for a in node_attrs])
+        self.logical_ids, self.logical_names = _intern([normalize_line(a['ligne']) for a in node_attrs])
+        self.display_names = [a.get('name', a['station_key']) for a in node_attrs]
+        self.latitude = np.array([a.get('latitude', np.nan) for a in node_attrs], dtype=np.float64)
+        self.longitude = np.array([a.get('longitude', np.nan) for a in node_attrs], dtype=np.float64)
+
+        # -- Adjacence CSR (graphe non orienté : chaque arête dans les deux sens, boucles une seule fois) --
+        src = np.array([u for u, v in edges] + [v for u, v in edges if u != v], dtype=np.int32)
+        dst = np.array([v for u, v in edges] + [u for u, v in edges if u != v], dtype=np.int32)
+        if distances is None:
+            distances = [np.nan] * len(edges)
+        dist = np.array(list(distances) + [d for (u, v), d in zip(edges, distances) if u != v], dtype=np.float64)
+        order = np.lexsort((dst, src))
+        self.indices = dst[order]
+        self.distance = dist[order]
+        self.indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n_nodes), out=self.indptr[1:])
+
+        self._index()
+
+    @classmethod
+    def from_arrays(cls, tables, arrays):
+        """
+        Reconstruit le réseau à partir de ses tables de noms et de ses tableaux (ARRAYS), par
+        exemple attachés à une mémoire partagée : les tableaux ne sont pas copiés.
+        """
+        net = cls.__new__(cls)
+        for name in cls.TABLES:
+            setattr(net, name, list(tables[name]))
+        for name in cls.ARRAYS:
+            setattr(net, name, arrays[name])
+        net._index()
+        return net
+
+    def _index(self):
+        # Structures dérivées des tableaux : index des noms, listes pour la boucle chaude, composantes
+        self.node_index = {n: i for i, n in enumerate(self.node_names)}
+        self.n_nodes = len(self.node_names)
+
+        self.station_nodes = {}
+        for i, s in enumerate(self.station_ids.tolist()):
+            self.station_nodes.setdefault(self.station_names[s], []).append(i)
+
+        # Copies en listes Python pour la boucle chaude (l'accès élément par élément
+        # à un tableau NumPy renvoie des scalaires NumPy, bien plus lents)
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        self.successors = [tuple(indices[indptr[i]:indptr[i + 1]]) for i in range(self.n_nodes)]
+        self.offsets = indptr  # arêtes de u : positions offsets[u] .. offsets[u + 1] - 1 (ordre de successors[u])
+        self.station_of = self.station_ids.tolist()
+        self.line_of = self.line_ids.tolist()
+        self.logical_of = self.logical_ids.tolist()
+
+        self.component_of = self._components()
+        self._hops_cache = OrderedDict()
+        self._fingerprint = None
+        self._minutes = None
+
+    @classmethod
+    def from_graph(cls, G):
+        node_names = sorted(G.nodes)
+        node_index = {n: i for i, n in enumerate(node_names)}
+        node_attrs = [G.nodes[n] for n in node_names]
+        edges = [(node_index[u], node_index[v]) for u, v in G.edges]
+        distances = [d.get("distance", np.nan) for u, v, d in G.edges(data=True)]
+        return cls(node_names, node_attrs, edges, distances)
+
+    def _components(self):
+        """
+        Composante connexe de chaque noeud (le graphe est non orienté).
+        """
+        component = [-1] * self.n_nodes
+        c = 0
+        for start in range(self.n_nodes):
+            if component[start] != -1:
+                continue
+            component[start] = c
+            queue = deque([start])
+            while queue:
+                u = queue.popleft()
+                for v in self.successors[u]:
+                    if component[v] == -1:
+                        component[v] = c
+                        queue.append(v)
+            c += 1
+        return component
+
+    def reachable(self, nodes_depart, nodes_arrivee):
+        """
+        Vrai si au moins un noeud d'arrivée est atteignable depuis un noeud de départ.
+        """
+        components = {self.component_of[n] for n in nodes_arrivee}
+        return any(self.component_of[n] in components for n in nodes_depart)
+
+    def hops_to(self, nodes_arrivee, cache_size=64):
+        """
+        Nombre minimal d'arrêts restants jusqu'au noeud d'arrivée le plus proche (BFS inverse
+        depuis l'ensemble d'arrivée), inf si injoignable. Mis en cache par ensemble d'arrivée.
+        """
+        key = frozenset(nodes_arrivee)
+        hops = self._hops_cache.get(key)
+        if hops is not None:
+            self._hops_cache.move_to_end(key)
+            return hops
+        hops = [float("inf")] * self.n_nodes
+        queue = deque()
+        for n in key:
+            hops[n] = 0
+            queue.append(n)
+        while queue:
+            u = queue.popleft()
+            d = hops[u] + 1
+            for v in self.successors[u]:
+                if hops[v] > d:
+                    hops[v] = d
+                    queue.append(v)
+        self._hops_cache[key] = hops
+        if len(self._hops_cache) > cache_size:
+            self._hops_cache.popitem(last=False)
+        return hops
+
+    def fingerprint(self):
+        """
+        Empreinte du réseau (noeuds + adjacence), calculée une seule fois.
+        """
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+            h.update("\n".join(self.node_names).encode("utf-8"))
+            h.update(self.indptr.tobytes())
+            h.update(self.indices.tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def travel_minutes(self):
+        """
+        Temps estimé (minutes) de chaque arête, aligné sur l'adjacence CSR (indices / offsets) :
+        l'arête u -> successors[u][j] est à la position offsets[u] + j.
+          - même station : correspondance (CORRESPONDANCE_MIN)
+          - distance connue : distance / vitesse commerciale de la ligne + ARRET_MIN
+          - sinon : INTERSTATION_MIN par arrêt
+        Calculé une seule fois par réseau.
+        """
+        if self._minutes is None:
+            vitesse = np.array([
+                VITESSE_KMH.get(name.split()[0], VITESSE_DEFAUT_KMH) * 1000.0 / 60.0  # m/min
+                for name in self.logical_names
+            ], dtype=np.float64)
+            src = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+            dst = self.indices
+            minutes = np.full(len(dst), INTERSTATION_MIN, dtype=np.float64)
+            connue = self.distance > 0
+            minutes[connue] = self.distance[connue] / vitesse[self.logical_ids[src[connue]]] + ARRET_MIN
+            minutes[self.station_ids[src] == self.station_ids[dst]] = CORRESPONDANCE_MIN
+            minutes[src == dst] = 0.0
+            self._minutes = minutes
+        return self._minutes
+
+    def neighbors(self, node_id):
+        return self.indices[self.indptr[node_id]:self.indptr[node_id + 1]]
+
+    def nodes_of_station(self, station_key):
+        return list(self.station_nodes.get(station_key, []))
+
+    def affluence_vector(self, affluence_mapping, default=0.2):
+        """
+        Vecteur dense d'affluence par noeud à partir du mapping {(station_key, ligne): score}.
+        """
+        stations = self.station_names
+        lines = self.line_names
+        return np.array([
+            affluence_mapping.get((stations[s], lines[l]), default)
+            for s, l in zip(self.station_of, self.line_of)
+        ], dtype=np.float64)
+
+_compiled_cache = weakref.WeakKeyDictionary()
+
+def compile_network(G):
+    """
+    Retourne le CompiledNetwork du graphe (mis en cache tant que le graphe existe).
+    Accepte aussi directement un CompiledNetwork.
+    """
+    if isinstance(G, CompiledNetwork):
+        return G
+    net = _compiled_cache.get(G)
+    if net is None:
+        net = _compiled_cache[G] = CompiledNetwork.from_graph(G)
+    return net
+
+def load_network(graph_path):
+    with open(graph_path, "rb") as f:
+        G = pickle.load(f)
+    return CompiledNetwork.from_graph(G)
+
+# -- Artefact binaire du réseau (écrit par graph_builder/build_graph.py) --
+# Répertoire de tableaux .npy ouverts en memory-map (lecture seule, pages partagées entre processus) :
+#   - un .npy par tableau de CompiledNetwork.ARRAYS (CSR, identifiants internés, coordonnées, distances)
+#   - strings.npy (octets UTF-8 concaténés) + string_offsets.npy : table des chaînes distinctes
+#   - un .npy par table de noms (CompiledNetwork.TABLES) : indices dans la table des chaînes
+#   - meta.json : version du format, empreinte des fichiers sources, empreinte du réseau
+NETWORK_FORMAT_VERSION = 1
+
+def save_network(net, network_dir, source=None):
+    os.makedirs(network_dir, exist_ok=True)
+    strings, string_ids = [], {}
+    for name in CompiledNetwork.TABLES:
+        ids = np.empty(len(getattr(net, name)), dtype=np.int32)
+        for i, value in enumerate(getattr(net, name)):
+            k = string_ids.get(value)
+            if k is None:
+                k = string_ids[value] = len(strings)
+                strings.append(value)
+            ids[i] = k
+        np.save(os.path.join(network_dir, f"{name}.npy"), ids)
+    encoded = [v.encode("utf-8") for v in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(network_dir, "strings.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(network_dir, "string_offsets.npy"), offsets)
+    for name in CompiledNetwork.ARRAYS:
+        np.save(os.path.join(network_dir, f"{name}.npy"), np.ascontiguousarray(getattr(net, name)))
+    # meta.json en dernier : un répertoire sans meta.json n'est jamais ouvert
+    with open(os.path.join(network_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": NETWORK_FORMAT_VERSION,
+            "source": source,
+            "network": net.fingerprint(),
+            "n_nodes": net.n_nodes,
+            "n_edges": int(len(net.indices)),
+        }, f)
+
+def open_network(network_dir, source=None):
+    """
+    Réseau compilé ouvert en memory-map depuis l'artefact, ou None s'il est absent, d'une autre
+    version du format, ou (si source est donnée) construit à partir d'autres fichiers sources.
+    """
+    meta_path = os.path.join(network_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != NETWORK_FORMAT_VERSION:
+        print(f"[WARN] Réseau {network_dir} : version {meta.get('version')} non supportée, ignoré")
+        return None
+    if source is not None and meta.get("source") != source:
+        print(f"[WARN] Réseau {network_dir} construit à partir d'autres données : ignoré")
+        return None
+
+    def load(name):
+        return np.load(os.path.join(network_dir, f"{name}.npy"), mmap_mode="r")
+
+    blob = load("strings").tobytes()
+    offsets = load("string_offsets").tolist()
+    strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+    tables = {name: [strings[k] for k in load(name).tolist()] for name in CompiledNetwork.TABLES}
+    net = CompiledNetwork.from_arrays(tables, {name: load(name) for name in CompiledNetwork.ARRAYS})
+    net._fingerprint = meta["network"]
+    return net
+
+def load_compiled_network(network_dir, graph_path):
+    """
+    Artefact binaire s'il est utilisable et construit à partir des mêmes données sources que le
+    pickle (tables du répertoire de graph_path), sinon compilation du pickle NetworkX.
+    """
+    from graph_builder.build_graph import source_digest  # import différé : build_graph importe ce module
+    try:
+        source = source_digest(os.path.dirname(graph_path))
+    except OSError:
+        source = None  # données sources absentes : empreinte non vérifiable
+    net = open_network(network_dir, source)
+    if net is None:
+        net = load_network(graph_path)
+    return net
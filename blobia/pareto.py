@@ -0,0 +1,198 @@
+import heapq
+import math
+
+from blobia.blob_solver import Label, curseur_weights, build_result, route_diversity, regle_anti_boucle
+
+CURSEURS = tuple(range(1, 11))
+INF = float("inf")
+MAX_LABELS_PAR_NOEUD = 6
+
+def _change(label):
+    # Changement de ligne sur le dernier arrêt : seul changement pénalisé par le score Blob
+    return label.parent is not None and label.ligne != label.parent.ligne
+
+def _domine(a, b, arrivee):
+    # a = (arrêts, somme des affluences, étiquette) domine b au même noeud : au plus autant d'arrêts
+    # et affluence moyenne au plus égale. Le score Blob porte sur l'affluence moyenne : comparer les
+    # sommes écarterait systématiquement les détours peu chargés des curseurs "zen". Le nombre total
+    # de changements n'entre pas dans le score : il ne compte qu'à l'arrivée, pour le dernier arrêt.
+    # Test heuristique (un prolongement chargé peut inverser l'ordre des moyennes, et l'état
+    # anti-boucle de a n'est pas comparé à celui de b) : le front obtenu est approché.
+    stops_a, aff_a, label_a = a
+    stops_b, aff_b, label_b = b
+    if stops_a > stops_b or aff_a * stops_b > aff_b * stops_a:
+        return False
+    if arrivee:
+        return not _change(label_a) or _change(label_b)
+    return True
+
+def pareto_path_solver(
+    net,
+    affluence,
+    nodes_depart,
+    nodes_arrivee,
+    curseurs=CURSEURS,
+    nb_routes=3,
+    max_iter=100000,
+    max_visites_station=2,
+    max_labels_par_noeud=MAX_LABELS_PAR_NOEUD
+):
+    """
+    Recherche multicritère (arrêts, somme des affluences) sur un CompiledNetwork, au plus
+    max_labels_par_noeud étiquettes non dominées (_domine) par noeud (None : pas de borne).
+    Le front est approché : la dominance est heuristique et la borne écarte des étiquettes non
+    dominées. Sur monuments.csv (2 départs, lundi 8h), face à compiled_path_solver curseur par curseur :
+    borne 6, meilleure route pire dans 14 cas sur 640 pour un temps voisin de 10 recherches ;
+    borne 12, 2 cas pour 2,3 fois ce temps ; sans borne, aucun pour 3,5 fois ce temps.
+    Retourne le front de Pareto des routes finies : liste de (arrets, changements, aff_sum, label).
+    Les mêmes règles anti-boucle que compiled_path_solver s'appliquent.
+    Une étiquette est abandonnée dès qu'aucun de ses prolongements ne peut entrer dans les
+    2 * nb_routes meilleures routes déjà trouvées, pour aucun des curseurs.
+    """
+    successors = net.successors
+    station_of = net.station_of
+    line_of = net.line_of
+    logical_of = net.logical_of
+    affluence = affluence.tolist() if hasattr(affluence, "tolist") else list(affluence)
+    is_arrivee = [False] * net.n_nodes
+    for n in nodes_arrivee:
+        is_arrivee[n] = True
+
+    if not net.reachable(nodes_depart, nodes_arrivee):
+        return []
+
+    # -- Borne inférieure du score final d'un prolongement à t arrêts (t >= arrêts + arrêts restants),
+    # chaque arrêt ajouté coûtant au moins aff_min en affluence, avec D = aff_sum - arrêts * aff_min :
+    #   alpha * t + beta * (aff_min + D / t), minimale en t* = sqrt(beta * D / alpha)
+    hops = net.hops_to(nodes_arrivee)
+    aff_min = min(affluence)
+    # Curseurs du plus permissif (zen) au plus strict : on sort au premier curseur intéressé
+    ordre = sorted(range(len(curseurs)), key=lambda c: curseurs[c], reverse=True)
+    weights = [curseur_weights(curseurs[c])[:2] for c in ordre]
+    bornes = [[] for _ in ordre]  # meilleurs scores finaux par curseur (tas max, valeurs négées)
+    seuils = [INF] * len(ordre)  # pire score gardé par curseur, INF tant qu'il en manque
+    keep = 2 * nb_routes
+
+    def utile(stops, aff_sum, node):
+        t_min = stops + hops[node]
+        excess = max(0.0, aff_sum - stops * aff_min)
+        for (alpha, beta), seuil in zip(weights, seuils):
+            if seuil == INF:
+                return True
+            t = math.sqrt(beta * excess / alpha)
+            if t < t_min:
+                t = t_min
+            if alpha * t + beta * (aff_min + excess / t) < seuil:
+                return True
+        return False
+
+    fronts = [[] for _ in range(net.n_nodes)]
+    dead = set()
+    finals = []
+
+    front = []
+    for dep in nodes_depart:
+        label = Label(None, dep, line_of[dep], affluence[dep], station_of[dep], logical_of[dep])
+        crit = (1, 0, affluence[dep])
+        fronts[dep].append((1, affluence[dep], label))
+        heapq.heappush(front, (crit, dep, label))
+
+    it = 0
+    while front and it < max_iter:
+        it += 1
+        crit, node, label = heapq.heappop(front)
+        if label in dead:
+            continue
+
+        stops, changes, aff_sum = crit
+        if is_arrivee[node]:
+            finals.append((crit, label))
+            for c, best in enumerate(bornes):
+                score = blob_score(label, stops, aff_sum, curseurs[ordre[c]])
+                if len(best) < keep:
+                    heapq.heappush(best, -score)
+                elif score < -best[0]:
+                    heapq.heapreplace(best, -score)
+                if len(best) == keep:
+                    seuils[c] = -best[0]
+            continue
+
+        if not utile(stops, aff_sum, node):
+            continue
+
+        passages, logiques = label.loop_state()
+        prev_station = label.parent.station if label.parent is not None else None
+
+        for succ in successors[node]:
+            succ_station = station_of[succ]
+            succ_line = line_of[succ]
+            succ_logique = logical_of[succ]
+
+            if regle_anti_boucle(label, passages, logiques, prev_station, succ_station, succ_logique,
+                                 succ_line, max_visites_station):
+                continue
+
+            new_crit = (stops + 1, changes + (succ_line != label.ligne), aff_sum + affluence[succ])
+            if hops[succ] == INF or not utile(new_crit[0], new_crit[2], succ):
+                continue
+            succ_label = Label(label, succ, succ_line, affluence[succ], succ_station, succ_logique)
+            entry = (new_crit[0], new_crit[2], succ_label)
+            arrivee = is_arrivee[succ]
+            succ_front = fronts[succ]
+            if any(_domine(other, entry, arrivee) for other in succ_front):
+                continue
+            kept = []
+            for other in succ_front:
+                if _domine(entry, other, arrivee):
+                    dead.add(other[2])
+                else:
+                    kept.append(other)
+            if max_labels_par_noeud is not None and len(kept) >= max_labels_par_noeud:
+                continue
+            kept.append(entry)
+            fronts[succ] = kept
+            heapq.heappush(front, (new_crit, succ, succ_label))
+
+    return [(c[0], c[1], c[2], l) for c, l in finals]
+
+def blob_score(label, stops, aff_sum, curseur):
+    """
+    Score Blob d'une route finie pour un curseur (même formule que compiled_path_solver).
+    """
+    if label.parent is None:
+        return 0.0
+    alpha, beta, gamma = curseur_weights(curseur)
+    penalty = gamma if label.ligne != label.parent.ligne else 0.0
+    return alpha * stops + beta * (aff_sum / stops) + penalty
+
+def routes_par_curseur(net, front, curseurs=CURSEURS, nb_routes=3, diversite_min=0.0):
+    """
+    Choisit dans le front de Pareto les meilleures routes pour chaque curseur.
+    Retourne { curseur: [résultats au format compiled_path_solver] }.
+    """
+    station_of = net.station_of
+    logical_of = net.logical_of
+    unwound = [(stops, aff_sum, label, label.unwind()) for stops, changes, aff_sum, label in front]
+    out = {}
+    for curseur in curseurs:
+        scored = sorted(
+            ((blob_score(label, stops, aff_sum, curseur), i) for i, (stops, aff_sum, label, _) in enumerate(unwound))
+        )
+        results = []
+        seen_routes = set()
+        kept_pairs = []
+        for score, i in scored:
+            path, affluences, lignes = unwound[i][3]
+            seq = tuple([station_of[n] for n in path])
+            if seq in seen_routes:
+                continue
+            seen_routes.add(seq)
+            pairs = {(station_of[n], logical_of[n]) for n in path}
+            if any(route_diversity(pairs, other) < diversite_min for other in kept_pairs):
+                continue
+            kept_pairs.append(pairs)
+            results.append(build_result(net, score, path, affluences))
+            if len(results) >= nb_routes:
+                break
+        out[curseur] = results
+    return out
@@ -1,35 +1,467 @@
-from blobia.blob_solver import blob_path_solver
+import os
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
+import numpy as np
 
-def find_best_route(
-    G,
-    affluence_mapping,
-    station_depart,
-    list_stations_arrivee,
-    curseur=1,
-    rayon_m=500,
-    verbose=False
-):
+from affluence_builder.affluence_tensor import build_affluence_tensor, slot_index, affluence_timeline, PAS_MIN
+from blobia.blob_solver import compiled_path_solver, SolverStats
+from blobia.network import CompiledNetwork, compile_network
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.names import normalize_name
+from blobia.pareto import CURSEURS, MAX_LABELS_PAR_NOEUD, pareto_path_solver, routes_par_curseur
+from blobia.route_table import load_route_table
+from blobia.tables import table_path
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DATA_FILES = (
+    os.path.join(DATA_DIR, "graph_blobia.gpickle"),
+    os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv"),
+    table_path(os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv")),
+    os.path.join(DATA_DIR, "graph_compiled", "meta.json"),
+)
+
+# -- Cache des résultats --
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _file_digest(path):
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+class RouteCache:
+    """
+    Cache LRU borné des résultats de find_best_route / find_routes_all_curseurs.
+    Les clés incluent la version des données (empreinte du contenu de data_files) : quand la
+    pipeline réécrit un de ces fichiers, la version change et le cache est vidé.
+    Le contenu n'est re-hashé que si la date ou la taille d'un fichier a changé.
+    Les résultats sont partagés entre les appels : ne pas les modifier.
+    Sûr entre threads (sessions Streamlit) : chaque méthode prend le verrou du cache.
+    """
+
+    def __init__(self, maxsize=256, data_files=DATA_FILES):
+        self.maxsize = maxsize
+        self.data_files = tuple(data_files)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._signature = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def data_version(self):
+        signature = tuple(_file_signature(p) for p in self.data_files)
+        with self._lock:
+            if signature != self._signature:
+                self._signature = signature
+                version = tuple(_file_digest(p) for p in self.data_files)
+                if version != self._version:
+                    if self._version is not None:
+                        self.invalidations += 1
+                        self._entries.clear()
+                    self._version = version
+            return self._version
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "invalidations": self.invalidations,
+            }
+
+ROUTE_CACHE = RouteCache()
+
+def _cache_key(cache, net, affluence, *query):
+    # affluence : vecteur dense par noeud (ou table horaire), le mapping lui-même n'étant pas hashable
+    return (cache.data_version(), net.fingerprint(), hashlib.sha1(affluence.tobytes()).hexdigest()) + query
+
+# -- Recherche --
+
+TABLE_RECHERCHE = {"mode": "table", "termine": True, "arret": "table", "iterations": 0,
+                   "frontiere": 0, "beam_ecartees": 0, "duree_ms": 0.0}
+
+def _table_routes(route_table, station_depart, monument, jour, heure, curseur, nb_routes, diversite_min):
+    """
+    Réponse de la table de routes (RouteTable.routes), ou None si elle ne couvre pas la requête.
+    """
+    if route_table is None or monument is None or jour is None or heure is None:
+        return None
+    routes = route_table.routes(station_depart, monument, jour, heure, curseur,
+                                nb_routes=nb_routes, diversite_min=diversite_min)
+    if not routes:
+        return None
+    for route in routes:
+        route["recherche"] = dict(TABLE_RECHERCHE)
+    return routes
+
+def check_query(depart, monument, jour, heure, curseur):
+    """
+    Contrôle d'une requête (service HTTP, mode batch) : (jour, heure, curseur, créneau) normalisés,
+    ou ValueError avec un message pour l'utilisateur.
+    """
+    if not depart or not monument:
+        raise ValueError("Paramètres 'depart' et 'monument' obligatoires")
+    jour = str(jour).lower()
+    try:
+        heure = int(heure)
+        curseur = int(curseur)
+    except (TypeError, ValueError):
+        raise ValueError("'heure' et 'curseur' doivent être des entiers")
+    if not 1 <= curseur <= 10:
+        raise ValueError(f"Curseur invalide : {curseur}")
+    return jour, heure, curseur, slot_index(jour, heure)
+
+def _route_nodes(net, station_depart, list_stations_arrivee):
     # 1. Noeuds départ
-    nodes_depart = [n for n, d in G.nodes(data=True) if d['station_key'] == station_depart]
+    nodes_depart = net.nodes_of_station(station_depart)
     if not nodes_depart:
         raise ValueError(f"Aucune station de départ trouvée pour '{station_depart}' dans le graphe !")
 
     # 2. Arrivée
     nodes_arrivee = []
     for s in list_stations_arrivee:
-        nodes_arrivee.extend([n for n, d in G.nodes(data=True) if d['station_key'] == s])
+        nodes_arrivee.extend(net.nodes_of_station(s))
     if not nodes_arrivee:
         raise ValueError(f"Aucune station d'arrivée trouvée pour {list_stations_arrivee} !")
+    return nodes_depart, nodes_arrivee
+
+def find_best_route(
+    G,
+    affluence_mapping,
+    station_depart,
+    list_stations_arrivee,
+    curseur=1,
+    rayon_m=500,
+    verbose=False,
+    astar=False,
+    k_routes=3,
+    diversite_min=0.2,
+    labels_par_noeud=2,
+    route_table=None,
+    monument=None,
+    jour=None,
+    heure=None,
+    cache=ROUTE_CACHE,
+    chain_skip=None,
+    deadline_ms=None,
+    beam_width=None,
+    beam_par_noeud=False,
+    return_stats=False,
+    horaire=False,
+    minute=0
+):
+    # G : graphe NetworkX ou CompiledNetwork (compilé une seule fois par graphe)
+    # k_routes : nombre de routes distinctes voulues (None = ancienne collecte de topk * 5 routes)
+    # route_table + monument/jour/heure : requête standard (ni horaire, ni échéance, ni faisceau)
+    # servie par la table sans recherche si elle la couvre (k_routes routes, voir RouteTable.routes)
+    # cache : RouteCache des requêtes déjà calculées (None pour le désactiver)
+    # chain_skip : parcours rapide des chaînes de stations sans correspondance (graph_builder/chain_skip.py),
+    # optionnel ; mêmes routes que sans, calculées plus vite (même entrée de cache)
+    # deadline_ms / beam_width (+ beam_par_noeud) : recherche bornée en temps / en taille de frontière (voir compiled_path_solver) ;
+    # les réponses à échéance dépendent de la charge et ne sont pas mises en cache
+    # return_stats : retourne (routes, SolverStats) au lieu des routes seules ; stats.recherche donne
+    # le bilan de la recherche même sans route trouvée (conservé avec les routes en cache)
+    # horaire : affluence de chaque arrêt à l'heure où on y arrive (départ jour heure:minute) ;
+    # affluence_mapping est alors le tenseur [7, 24, n_noeuds] et la table de routes n'est pas consultée
+    stats = SolverStats()
+    net = compile_network(G)
+    nodes_depart, nodes_arrivee = _route_nodes(net, station_depart, list_stations_arrivee)
+
+    if not horaire and deadline_ms is None and beam_width is None:
+        routes = _table_routes(route_table, station_depart, monument, jour, heure, curseur,
+                               k_routes or 3, diversite_min if k_routes is not None else 0.0)
+        if routes is not None:
+            if return_stats:
+                stats.source = "table"
+                stats.recherche = dict(TABLE_RECHERCHE)
+                return routes, stats
+            return routes
+
+    # Vecteur dense par noeud (tranche du tenseur d'affluence, via slot_index), ou ancien mapping
+    # {(station_key, ligne): score} de get_affluence_mapping, converti à chaque appel
+    timeline = None
+    if horaire:
+        if not (isinstance(affluence_mapping, np.ndarray) and affluence_mapping.ndim == 3) or jour is None or heure is None:
+            raise ValueError("Mode horaire : tenseur d'affluence [7, 24, n_noeuds], jour et heure obligatoires")
+        timeline = affluence_timeline(affluence_mapping, jour, heure, minute)
+        affluence = timeline
+    elif isinstance(affluence_mapping, np.ndarray):
+        affluence = affluence_mapping
+    else:
+        affluence = net.affluence_vector(affluence_mapping)
+    if deadline_ms is not None:
+        cache = None
+    if cache is not None:
+        key = _cache_key(cache, net, affluence, "horaire" if horaire else "best", station_depart, tuple(list_stations_arrivee),
+                         curseur, astar, k_routes, diversite_min, labels_par_noeud, beam_width, beam_par_noeud)
+        cached = cache.get(key)
+        if cached is not None:
+            results, recherche = cached
+            if return_stats:
+                stats.source = "cache"
+                stats.recherche = dict(recherche)
+                return list(results), stats
+            return list(results)
 
     # 3. Appel blob_solver (on récupère plusieurs routes, déjà filtrées)
-    results = blob_path_solver(
-        G,
-        affluence_mapping,
+    results = compiled_path_solver(
+        net,
+        affluence,
         nodes_depart,
         nodes_arrivee,
         curseur=curseur,
         verbose=verbose,
         max_visites_station=2,
-        topk=8
+        topk=8,
+        astar=astar,
+        k_routes=k_routes,
+        diversite_min=diversite_min,
+        labels_par_noeud=labels_par_noeud,
+        chain_skip=chain_skip,
+        deadline_ms=deadline_ms,
+        beam_width=beam_width,
+        beam_par_noeud=beam_par_noeud,
+        stats=stats,
+        horaire=timeline,
+        pas_min=PAS_MIN
     )
+    if cache is not None:
+        cache.put(key, (list(results), dict(stats.recherche)))
+    if return_stats:
+        return results, stats
     return results
+
+def find_routes_all_curseurs(
+    G,
+    affluence_mapping,
+    station_depart,
+    list_stations_arrivee,
+    curseurs=CURSEURS,
+    nb_routes=3,
+    diversite_min=0.2,
+    route_table=None,
+    monument=None,
+    jour=None,
+    heure=None,
+    cache=ROUTE_CACHE,
+    max_labels_par_noeud=MAX_LABELS_PAR_NOEUD
+):
+    """
+    Une seule recherche multicritère, puis les meilleures routes pour chaque curseur :
+    { curseur: [résultats au format find_best_route] }.
+    max_labels_par_noeud : borne du front de pareto_path_solver (approché, voir sa documentation).
+    Si la table de routes couvre la requête pour tous les curseurs, aucune recherche n'est lancée.
+    """
+    net = compile_network(G)
+    nodes_depart, nodes_arrivee = _route_nodes(net, station_depart, list_stations_arrivee)
+
+    routes = {c: _table_routes(route_table, station_depart, monument, jour, heure, c, nb_routes, diversite_min)
+              for c in curseurs}
+    if all(r is not None for r in routes.values()):
+        return routes
+
+    if isinstance(affluence_mapping, np.ndarray):
+        affluence = affluence_mapping
+    else:
+        affluence = net.affluence_vector(affluence_mapping)
+    if cache is not None:
+        key = _cache_key(cache, net, affluence, "pareto", station_depart, tuple(list_stations_arrivee),
+                         tuple(curseurs), nb_routes, diversite_min, max_labels_par_noeud)
+        out = cache.get(key)
+        if out is not None:
+            return {c: list(r) for c, r in out.items()}
+
+    front = pareto_path_solver(
+        net,
+        affluence,
+        nodes_depart,
+        nodes_arrivee,
+        curseurs=curseurs,
+        nb_routes=nb_routes,
+        max_labels_par_noeud=max_labels_par_noeud
+    )
+    out = routes_par_curseur(net, front, curseurs=curseurs, nb_routes=nb_routes, diversite_min=diversite_min)
+    if cache is not None:
+        cache.put(key, {c: list(r) for c, r in out.items()})
+    return out
+
+# -- Traitement par lots --
+
+def _share_arrays(arrays, directory):
+    """
+    Ecrit les tableaux en .npy dans directory (sous /dev/shm quand il existe : fichiers en mémoire),
+    pour que les processus les ouvrent en memory-map. Retourne { nom: chemin }.
+    """
+    paths = {}
+    for name, arr in arrays.items():
+        paths[name] = os.path.join(directory, f"{name}.npy")
+        np.save(paths[name], np.ascontiguousarray(arr))
+    return paths
+
+# -- Etat des processus de calcul (attaché une fois par processus) --
+_batch = {}
+
+def _batch_init(tables, paths, route_table_dir, options):
+    arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+    net = CompiledNetwork.from_arrays(tables, arrays)
+    _batch["net"] = net
+    _batch["affluence"] = arrays["affluence"]
+    _batch["route_table"] = load_route_table(route_table_dir, net, arrays["affluence"]) if route_table_dir else None
+    _batch["options"] = options
+
+def _batch_routes(tasks):
+    out = []
+    for station_depart, arr_station_keys, slot, monument, jour, heure, curseur in tasks:
+        try:
+            # Mode horaire : tenseur complet (table horaire construite depuis le créneau de départ)
+            affluence = _batch["affluence"] if _batch["options"].get("horaire") else _batch["affluence"][slot]
+            routes = find_best_route(
+                _batch["net"],
+                affluence,
+                station_depart,
+                arr_station_keys,
+                curseur=curseur,
+                route_table=_batch["route_table"],
+                monument=monument,
+                jour=jour,
+                heure=heure,
+                **_batch["options"]
+            )
+            out.append((routes, None))
+        except ValueError as e:
+            out.append((None, str(e)))
+        except Exception as e:
+            # Une requête en erreur ne doit pas faire échouer le reste du lot
+            out.append((None, f"Erreur interne : {e!r}"))
+    return out
+
+def find_best_routes_batch(
+    G,
+    affluence_df,
+    queries,
+    affluence_tensor=None,
+    workers=None,
+    chunksize=16,
+    route_table_dir=None,
+    monuments_csv=os.path.join(DATA_DIR, "monuments.csv"),
+    stations_csv=os.path.join(DATA_DIR, "graph_nodes.csv"),
+    **options
+):
+    """
+    Calcule un lot de requêtes (station_depart, monument, jour, heure, curseur) sur un pool de processus.
+    Le réseau compilé et le tenseur d'affluence [7, 24, n_noeuds] (affluence_tensor, sinon
+    calculé depuis affluence_df) sont écrits une fois en .npy (mémoire
+    partagée /dev/shm si possible) : les processus les ouvrent en memory-map, sans copie ni
+    dépickling du graphe.
+    Génère (requete, routes, erreur) dans l'ordre des requêtes, au fil des résultats ; erreur est
+    un message (requête invalide selon check_query, station ou monument introuvable) et routes
+    vaut alors None. Une requête peut aussi être une exception (ligne illisible du fichier de
+    requêtes) : elle est rendue en erreur, sans interrompre le lot.
+    options : paramètres de find_best_route (k_routes, astar, deadline_ms, ...).
+    """
+    net = compile_network(G)
+    workers = workers or os.cpu_count() or 1
+
+    if affluence_tensor is None:
+        affluence_tensor = build_affluence_tensor(net, affluence_df)
+    arrays = {name: getattr(net, name) for name in CompiledNetwork.ARRAYS}
+    arrays["affluence"] = affluence_tensor
+    tables = {name: getattr(net, name) for name in CompiledNetwork.TABLES}
+
+    arrivals = {}
+
+    def prepare(query):
+        if isinstance(query, Exception):
+            return None, f"Requête illisible : {query}"
+        station_depart, monument, jour, heure, curseur = query
+        try:
+            jour, heure, curseur, slot = check_query(station_depart, monument, jour, heure, curseur)
+        except ValueError as e:
+            return None, f"Requête invalide : {e}"
+        if monument not in arrivals:
+            try:
+                stations = arrival_nodes_near_monument(
+                    net, monument, monuments_csv=monuments_csv, stations_csv=stations_csv
+                )[0]
+            except ValueError as e:
+                arrivals[monument] = (None, str(e))
+            else:
+                arrivals[monument] = (stations, None) if stations else \
+                    (None, f"Aucune station d'arrivée trouvée près du monument « {monument} »")
+        stations, err = arrivals[monument]
+        if err is not None:
+            return None, err
+        return (normalize_name(station_depart), stations, slot, monument, jour, heure, curseur), None
+
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(prefix="blobia_batch_", dir=shm_dir) as directory:
+        paths = _share_arrays(arrays, directory)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_batch_init,
+                                 initargs=(tables, paths, route_table_dir, options)) as pool:
+            # Fenêtre bornée de lots en cours : les requêtes sont lues au fur et à mesure
+            pending = deque()
+            queries = iter(queries)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 4 * workers:
+                    chunk = []
+                    for query in queries:
+                        chunk.append((query,) + prepare(query))
+                        if len(chunk) >= chunksize:
+                            break
+                    else:
+                        exhausted = True
+                    if chunk:
+                        tasks = [task for _, task, err in chunk if err is None]
+                        pending.append((chunk, pool.submit(_batch_routes, tasks)))
+                if not pending:
+                    break
+                chunk, future = pending.popleft()
+                try:
+                    done = iter(future.result())
+                except Exception as e:
+                    # Processus de calcul perdu (ou lot non transmissible) : seul ce lot est en erreur
+                    done = iter([(None, f"Erreur interne : {e!r}")] * len(chunk))
+                for query, task, err in chunk:
+                    if err is not None:
+                        yield query, None, err
+                    else:
+                        yield (query,) + next(done)
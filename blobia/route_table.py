@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Ajoute le dossier parent au PYTHONPATH (exécution en script depuis data_pipeline.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from affluence_builder.affluence_tensor import get_affluence_tensor, JOURS, HEURES
+from blobia.network import load_compiled_network
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.names import normalize_name
+from blobia.blob_solver import build_result, route_diversity
+from blobia.pareto import CURSEURS
+from blobia.route_tree import RouteTree, build_route_tree
+
+TABLE_VERSION = 2
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+TABLE_DIR = os.path.join(DATA_DIR, 'route_table')
+
+def affluence_digest(affluence_tensor):
+    """
+    Empreinte du tenseur d'affluence [7, 24, n_noeuds] (valeurs float32).
+    """
+    return hashlib.sha1(np.ascontiguousarray(affluence_tensor, dtype=np.float32).tobytes()).hexdigest()
+
+# -- Etat des processus de calcul (transmis une fois par processus) --
+_worker = {}
+
+def _init_worker(net, profiles, arrivals, curseurs):
+    _worker["net"] = net
+    _worker["profiles"] = profiles
+    _worker["arrivals"] = arrivals
+    _worker["curseurs"] = curseurs
+
+def _build_trees(task):
+    m, p = task
+    net = _worker["net"]
+    dtype = np.int16 if net.n_nodes < np.iinfo(np.int16).max else np.int32
+    return [
+        build_route_tree(net, _worker["profiles"][p], _worker["arrivals"][m], curseur=c).next_node.astype(dtype)
+        for c in _worker["curseurs"]
+    ]
+
+def build_route_table(
+    net,
+    affluence_tensor,
+    monuments,
+    output_dir=TABLE_DIR,
+    monuments_csv=os.path.join(DATA_DIR, "monuments.csv"),
+    stations_csv=os.path.join(DATA_DIR, "graph_nodes.csv"),
+    curseurs=CURSEURS,
+    workers=None
+):
+    """
+    Précalcule l'arbre des meilleures routes pour chaque monument x profil (jour, heure) x curseur,
+    avec l'affluence du tenseur [7, 24, n_noeuds] (mêmes vecteurs que la recherche en direct), et l'écrit dans output_dir sous forme de tableaux .npy (lisibles en memory-map) :
+      - next_node.npy    [n_arbres, n_noeuds]  noeud suivant vers l'arrivée (arbres dédupliqués)
+      - trees.npy        [n_monuments, n_profils, n_curseurs]  indice d'arbre (-1 : pas d'arrivée)
+      - profiles.npy     [7, 24]  indice de profil d'affluence de chaque (jour, heure)
+      - affluence.npy    [n_profils, n_noeuds]  vecteurs d'affluence distincts
+      - meta.json        version, monuments, curseurs, empreintes du réseau et du tenseur d'affluence
+    Les (jour, heure) qui donnent le même vecteur d'affluence partagent leurs arbres.
+    """
+    t0 = time.time()
+
+    # 1. Profils d'affluence distincts
+    profile_index = np.zeros((len(JOURS), HEURES), dtype=np.int32)
+    profiles = []
+    seen = {}
+    for j in range(len(JOURS)):
+        for h in range(HEURES):
+            vec = np.ascontiguousarray(affluence_tensor[j, h])
+            key = vec.tobytes()
+            if key not in seen:
+                seen[key] = len(profiles)
+                profiles.append(vec)
+            profile_index[j, h] = seen[key]
+
+    # 2. Noeuds d'arrivée de chaque monument
+    arrivals = [
+        arrival_nodes_near_monument(net, m, monuments_csv=monuments_csv, stations_csv=stations_csv)[1]
+        for m in monuments
+    ]
+
+    # 3. Arbres en parallèle, dédupliqués
+    trees_index = np.full((len(monuments), len(profiles), len(curseurs)), -1, dtype=np.int32)
+    tasks = [(m, p) for m in range(len(monuments)) if arrivals[m] for p in range(len(profiles))]
+    trees = []
+    tree_ids = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(net, profiles, arrivals, list(curseurs))) as pool:
+        for (m, p), per_curseur in zip(tasks, pool.map(_build_trees, tasks, chunksize=8)):
+            for c, next_node in enumerate(per_curseur):
+                key = next_node.tobytes()
+                if key not in tree_ids:
+                    tree_ids[key] = len(trees)
+                    trees.append(next_node)
+                trees_index[m, p, c] = tree_ids[key]
+
+    # 4. Ecriture
+    os.makedirs(output_dir, exist_ok=True)
+    dtype = np.int16 if net.n_nodes < np.iinfo(np.int16).max else np.int32
+    next_node = np.stack(trees) if trees else np.zeros((0, net.n_nodes), dtype=dtype)
+    np.save(os.path.join(output_dir, "next_node.npy"), next_node)
+    np.save(os.path.join(output_dir, "trees.npy"), trees_index)
+    np.save(os.path.join(output_dir, "profiles.npy"), profile_index)
+    np.save(os.path.join(output_dir, "affluence.npy"), np.stack(profiles))
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": TABLE_VERSION,
+            "network": net.fingerprint(),
+            "affluence": affluence_digest(affluence_tensor),
+            "n_nodes": net.n_nodes,
+            "monuments": list(monuments),
+            "jours": JOURS,
+            "heures": list(range(HEURES)),
+            "curseurs": list(curseurs),
+        }, f, ensure_ascii=False, indent=1)
+
+    print(f"Table de routes : {len(monuments)} monuments, {len(profiles)} profils d'affluence, "
+          f"{len(curseurs)} curseurs -> {len(trees)} arbres distincts ({time.time() - t0:.1f}s)")
+    return output_dir
+
+class RouteTable:
+    """
+    Table de routes précalculée, ouverte en lecture seule et en memory-map.
+    affluence_tensor : tenseur [7, 24, n_noeuds] de la recherche en direct ; la table doit avoir été
+    calculée avec les mêmes valeurs.
+    """
+
+    def __init__(self, table_dir, net, affluence_tensor):
+        with open(os.path.join(table_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != TABLE_VERSION:
+            raise ValueError(f"Table de routes {table_dir} : version {meta.get('version')} non supportée")
+        if meta["network"] != net.fingerprint():
+            raise ValueError(f"Table de routes {table_dir} : calculée pour un autre réseau")
+        if meta.get("affluence") != affluence_digest(affluence_tensor):
+            raise ValueError(f"Table de routes {table_dir} : calculée pour une autre affluence")
+        self.net = net
+        self.monuments = {normalize_name(m): i for i, m in enumerate(meta["monuments"])}
+        self.jours = {j: i for i, j in enumerate(meta["jours"])}
+        self.curseurs = {c: i for i, c in enumerate(meta["curseurs"])}
+        self.next_node = np.load(os.path.join(table_dir, "next_node.npy"), mmap_mode="r")
+        self.trees = np.load(os.path.join(table_dir, "trees.npy"), mmap_mode="r")
+        self.profiles = np.load(os.path.join(table_dir, "profiles.npy"), mmap_mode="r")
+        self.affluence = np.load(os.path.join(table_dir, "affluence.npy"), mmap_mode="r")
+
+    def tree(self, monument, jour, heure, curseur):
+        m = self.monuments.get(normalize_name(monument))
+        j = self.jours.get(str(jour).lower())
+        c = self.curseurs.get(curseur)
+        if m is None or j is None or c is None or not 0 <= int(heure) < self.profiles.shape[1]:
+            return None
+        p = int(self.profiles[j, int(heure)])
+        t = int(self.trees[m, p, c])
+        if t < 0:
+            return None
+        return RouteTree(self.net, self.next_node[t], self.affluence[p], curseur)
+
+    def routes(self, station_depart, monument, jour, heure, curseur, nb_routes=3, diversite_min=0.0):
+        """
+        Routes précalculées depuis la station, sans recherche : les chemins des arbres de tous les
+        curseurs du même profil d'affluence (un par noeud de départ), classés par score pour ce
+        curseur, sans doublon de stations et avec au moins diversite_min de couples
+        (station, ligne logique) propres à chaque route. None si la requête n'est pas couverte.
+        """
+        tree = self.tree(monument, jour, heure, curseur)
+        if tree is None:
+            return None
+        net = self.net
+        m = self.monuments[normalize_name(monument)]
+        p = int(self.profiles[self.jours[str(jour).lower()], int(heure)])
+        nodes_depart = net.nodes_of_station(station_depart)
+        candidates = []
+        for t in sorted({int(t) for t in self.trees[m, p] if t >= 0}):
+            other = RouteTree(net, self.next_node[t], self.affluence[p], curseur)
+            for node in nodes_depart:
+                path = other.path_from_node(node)
+                if path is not None:
+                    candidates.append((tree.path_score(path), path))
+        candidates.sort()
+
+        results = []
+        seen_routes = set()
+        kept_pairs = []
+        for score, path in candidates:
+            seq = tuple([net.station_of[n] for n in path])
+            if seq in seen_routes:
+                continue
+            seen_routes.add(seq)
+            pairs = {(net.station_of[n], net.logical_of[n]) for n in path}
+            if any(route_diversity(pairs, other) < diversite_min for other in kept_pairs):
+                continue
+            kept_pairs.append(pairs)
+            results.append(build_result(net, score, path, [float(tree.affluence[n]) for n in path]))
+            if len(results) >= nb_routes:
+                break
+        return results
+
+def load_route_table(table_dir, net, affluence_tensor):
+    """
+    Ouvre la table si elle existe et correspond au réseau et au tenseur d'affluence, sinon None
+    (recherche en direct seule).
+    """
+    if not os.path.exists(os.path.join(table_dir, "meta.json")):
+        return None
+    try:
+        return RouteTable(table_dir, net, affluence_tensor)
+    except ValueError as e:
+        print(f"[WARN] {e}")
+        return None
+
+if __name__ == "__main__":
+    net = load_compiled_network(os.path.join(DATA_DIR, "graph_compiled"), os.path.join(DATA_DIR, "graph_blobia.gpickle"))
+    tensor = get_affluence_tensor(net, os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv"))
+    monuments = pd.read_csv(os.path.join(DATA_DIR, "monuments.csv"), encoding='cp1252')["Monument"].tolist()
+    build_route_table(net, tensor, monuments)
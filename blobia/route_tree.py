@@ -0,0 +1,125 @@
+import heapq
+import numpy as np
+
+from blobia.blob_solver import Label, curseur_weights, build_result, regle_anti_boucle
+
+INF = float("inf")
+ROOT = -1       # noeud d'arrivée
+UNREACHED = -2  # noeud sans route vers l'arrivée
+
+class RouteTree:
+    """
+    Arbre des meilleures routes vers un ensemble d'arrivée (un monument), pour une affluence
+    et un curseur donnés : pour chaque noeud, le noeud suivant vers l'arrivée
+    (ROOT pour les noeuds d'arrivée, UNREACHED sans route).
+    Les scores sont recalculés à partir des chemins quand ils ne sont pas fournis.
+    """
+
+    def __init__(self, net, next_node, affluence, curseur, score=None):
+        self.net = net
+        self.next_node = next_node
+        self.affluence = np.asarray(affluence, dtype=np.float64)
+        self.curseur = curseur
+        self.score = score
+
+    def path_from_node(self, node):
+        nxt = int(self.next_node[node])
+        if nxt == UNREACHED:
+            return None
+        path = [node]
+        while nxt != ROOT:
+            path.append(nxt)
+            nxt = int(self.next_node[nxt])
+        return path
+
+    def path_score(self, path):
+        """
+        Score Blob d'une route (même formule que compiled_path_solver).
+        """
+        if len(path) < 2:
+            return 0.0
+        alpha, beta, gamma = curseur_weights(self.curseur)
+        line_of = self.net.line_of
+        penalty = gamma if line_of[path[-1]] != line_of[path[-2]] else 0.0
+        aff_moy = float(sum(self.affluence[n] for n in path)) / len(path)
+        return alpha * len(path) + beta * aff_moy + penalty
+
+    def route_from_station(self, station_key):
+        """
+        Meilleure route depuis une station (parcours de l'arbre, sans recherche),
+        au format de compiled_path_solver, ou None si aucune route.
+        """
+        best = None
+        for node in self.net.nodes_of_station(station_key):
+            path = self.path_from_node(node)
+            if path is None:
+                continue
+            score = float(self.score[node]) if self.score is not None else self.path_score(path)
+            if best is None or (score, node) < best[:2]:
+                best = (score, node, path)
+        if best is None:
+            return None
+        score, node, path = best
+        affluences = [float(self.affluence[n]) for n in path]
+        return build_result(self.net, score, path, affluences)
+
+def build_route_tree(net, affluence, nodes_arrivee, curseur=1, max_visites_station=2):
+    """
+    Recherche inverse depuis les noeuds d'arrivée vers tout le réseau, en une passe.
+    Une étiquette de la recherche inverse représente la route noeud -> ... -> arrivée :
+    son score est exactement le score Blob de cette route (le changement de ligne pénalisé
+    est celui de la dernière arête, fixé dès la première expansion depuis l'arrivée).
+    Chaque noeud garde la première étiquette fixée, ce qui forme un arbre.
+    """
+    alpha, beta, gamma = curseur_weights(curseur)
+
+    successors = net.successors
+    station_of = net.station_of
+    line_of = net.line_of
+    logical_of = net.logical_of
+    aff = affluence.tolist() if hasattr(affluence, "tolist") else list(affluence)
+
+    next_node = np.full(net.n_nodes, UNREACHED, dtype=np.int32)
+    score = np.full(net.n_nodes, INF, dtype=np.float64)
+    settled = [False] * net.n_nodes
+
+    front = []
+    for arr in nodes_arrivee:
+        heapq.heappush(front, (0.0, arr, Label(None, arr, line_of[arr], aff[arr], station_of[arr], logical_of[arr]), 0.0))
+
+    while front:
+        s, node, label, penalty = heapq.heappop(front)
+        if settled[node]:
+            continue
+        settled[node] = True
+        score[node] = s
+        next_node[node] = label.parent.node if label.parent is not None else ROOT
+
+        passages, logiques = label.loop_state()
+        prev_station = label.parent.station if label.parent is not None else None
+
+        for succ in successors[node]:
+            if settled[succ]:
+                continue
+            succ_station = station_of[succ]
+            succ_line = line_of[succ]
+            succ_logique = logical_of[succ]
+
+            if regle_anti_boucle(label, passages, logiques, prev_station, succ_station, succ_logique,
+                                 succ_line, max_visites_station):
+                continue
+
+            # La pénalité de changement porte sur la dernière arête de la route : la première ici
+            succ_penalty = penalty
+            if label.parent is None and succ_line != label.ligne:
+                succ_penalty = gamma
+            aff_moy = (label.aff_sum + aff[succ]) / (label.depth + 1)
+            new_score = alpha * (label.depth + 1) + beta * aff_moy + succ_penalty
+            heapq.heappush(front, (
+                new_score,
+                succ,
+                Label(label, succ, succ_line, aff[succ], succ_station, succ_logique),
+                succ_penalty
+            ))
+
+    return RouteTree(net, next_node, affluence, curseur, score=score)
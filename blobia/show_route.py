@@ -29,6 +29,8 @@ def format_route(result, i=None):
         out.append(f"Affluence moyenne       : {res['affluence_moyenne']:.4f}")
         out.append(f"Affluence max           : {res['affluence_max']:.4f}")
         out.append(f"Stations affluence max  : {', '.join(res['stations_affluence_max'])}")
+        if "duree_min" in res:
+            out.append(f"Durée estimée           : {res['duree_min']:.0f} min")
         
         return "\n".join(out)
 
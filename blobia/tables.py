@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pandas as pd
+
+# -- Tables intermédiaires de la pipeline en colonnes (.npz) --
+# data/tables/<nom>.npz remplace data/<nom>.csv entre deux étapes : types conservés (coordonnées en
+# float64, clés en texte), colonnes lues à la demande. Une colonne de texte est stockée en
+# catégories (valeurs distinctes) + codes int32 (-1 : valeur manquante). Le CSV n'est plus qu'une
+# sortie de debug (EXPORT_CSV), et reste lu quand la table n'a pas encore été générée.
+
+TABLE_FORMAT_VERSION = 1
+TABLES_DIR_NAME = "tables"
+EXPORT_CSV = os.environ.get("BLOBIA_EXPORT_CSV", "") not in ("", "0")
+
+NUMERIQUE = "n"
+CATEGORIE = "c"
+
+def table_path(csv_path):
+    """
+    Table en colonnes qui correspond à un CSV de data/ : data/tables/<nom>.npz.
+    """
+    directory, name = os.path.split(csv_path)
+    return os.path.join(directory, TABLES_DIR_NAME, os.path.splitext(name)[0] + ".npz")
+
+def table_source(csv_path):
+    """
+    Fichier effectivement lu par read_table : la table en colonnes si elle existe, sinon le CSV.
+    """
+    path = table_path(csv_path)
+    return path if os.path.exists(path) else csv_path
+
+def save_table(df, csv_path, csv=None):
+    """
+    Ecrit df dans table_path(csv_path), et dans csv_path si csv (par défaut : EXPORT_CSV).
+    """
+    path = table_path(csv_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            kinds.append(NUMERIQUE)
+            arrays[f"c{i}"] = series.to_numpy()
+        else:
+            kinds.append(CATEGORIE)
+            codes, categories = pd.factorize(series)
+            arrays[f"c{i}_codes"] = codes.astype(np.int32)
+            arrays[f"c{i}_categories"] = np.array([str(c) for c in categories], dtype=str)
+    tmp = path + ".tmp.npz"
+    np.savez(
+        tmp,
+        version=np.array(TABLE_FORMAT_VERSION),
+        columns=np.array([str(c) for c in df.columns], dtype=str),
+        kinds=np.array(kinds, dtype=str),
+        **arrays
+    )
+    os.replace(tmp, path)
+    if csv if csv is not None else EXPORT_CSV:
+        df.to_csv(csv_path, index=False)
+
+def load_table(path, columns=None):
+    """
+    Table .npz écrite par save_table ; seules les colonnes demandées sont lues (toutes si None).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != TABLE_FORMAT_VERSION:
+            raise ValueError(f"{path} : version de table {int(data['version'])} non supportée")
+        names = data["columns"].tolist()
+        kinds = data["kinds"].tolist()
+        missing = [c for c in columns or () if c not in names]
+        if missing:
+            raise ValueError(f"{path} : colonnes absentes {missing}")
+        out = {}
+        for col in columns if columns is not None else names:
+            i = names.index(col)
+            if kinds[i] == NUMERIQUE:
+                out[col] = data[f"c{i}"]
+            else:
+                codes = data[f"c{i}_codes"]
+                values = data[f"c{i}_categories"].astype(object)[codes]
+                values[codes < 0] = np.nan
+                out[col] = values
+    return pd.DataFrame(out)
+
+def read_table(csv_path, columns=None, **csv_kwargs):
+    """
+    Table intermédiaire d'un CSV de data/ : version en colonnes si elle existe, sinon le CSV
+    (données livrées avec le dépôt, pipeline pas encore relancée).
+    """
+    path = table_path(csv_path)
+    if os.path.exists(path):
+        return load_table(path, columns)
+    df = pd.read_csv(csv_path, usecols=columns, **csv_kwargs)
+    return df if columns is None else df[list(columns)]
@@ -1,31 +1,165 @@
-import subprocess
 import os
 import sys
+import glob
+import argparse
+import pandas as pd
+
+from pipeline_dag import Stage, Pipeline, print_report, ECHEC, ANNULEE
+from graph_builder import normalize, build_graph, chain_skip
+from affluence_builder import ingest_validations, create_affluence, affluence_tensor
+from affluence_builder.get_affluence import normalize_affluence_table, load_affluence_table
+from blobia.network import load_compiled_network
+from blobia import route_table, tables
+from blobia.tables import read_table, table_path
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+def data(name):
+    return os.path.join(DATA_DIR, name)
+
+def table(name):
+    return table_path(data(name))
+
+def code(*modules):
+    return [os.path.join(BASE_DIR, m) for m in modules]
 
-def run_script(script_path):
-    print(f"\n[PIPELINE] Exécution de : {script_path}")
-    result = subprocess.run([sys.executable, script_path])
-    if result.returncode != 0:
-        print(f"[ERREUR] Le script {script_path} a échoué.")
-        exit(1)
-    print(f"[OK] {script_path} terminé.")
+NETWORK_DIR = data(build_graph.NETWORK_DIR_NAME)
+NETWORK_META = os.path.join(NETWORK_DIR, "meta.json")
+GRAPH_PATH = data("graph_blobia.gpickle")
+STATIONS_ALIGNED = data("Stations_IDF_aligned.csv")
+GARES_ALIGNED = data("emplacement_des_gares_idf_aligned.csv")
+AFFLUENCE_PATH = create_affluence.OUTPUT_PATH
 
-def main():
+# -- Etapes : chacune reçoit les valeurs des étapes amont en mémoire (ctx.get) --
+
+def run_normalize(ctx):
     # 1. Normalisation des données de gares
-    run_script(os.path.join(BASE_DIR, "graph_builder", "normalize.py"))
-    
-    # 2. Construction du graphe (nodes/edges/graph_blobia.gpickle)
-    run_script(os.path.join(BASE_DIR, "graph_builder", "build_graph.py"))
-    
+    return normalize.align_tables_with_synonyms(*normalize.normalize_tables())
+
+def load_normalize():
+    return read_table(STATIONS_ALIGNED), read_table(GARES_ALIGNED)
+
+def run_graph(ctx):
+    # 2. Construction du graphe (nodes/edges/graph_blobia.gpickle + réseau compilé graph_compiled/)
+    stations, gares = ctx.get("normalize")
+    return build_graph.build_graph(stations, build_graph.build_nodes(gares))
+
+def load_graph():
+    return load_compiled_network(NETWORK_DIR, GRAPH_PATH)
+
+def run_chain_skip(ctx):
+    # 2b. Raccourci de parcours des chaînes de stations sans correspondance (graph_chain_skip.pkl)
+    net = ctx.get("graph")
+    skip = chain_skip.build_chain_skip(net)
+    chain_skip.save_chain_skip(skip)
+    print(f"Raccourci de chaînes : {skip.n_intermediate} noeuds intermédiaires sur {net.n_nodes}")
+
+def run_validations(ctx):
+    # 3a. Profils d'affluence mesurés depuis les journaux de validations de data/validations/ (s'il y en a)
+    paths = sorted(
+        p for ext in ("*.csv", "*.csv.gz", "*.txt", "*.txt.gz")
+        for p in glob.glob(os.path.join(ingest_validations.VALIDATIONS_DIR, ext))
+    )
+    if not paths:
+        print(f"Aucun journal de validations dans {ingest_validations.VALIDATIONS_DIR} : profils de utils.py conservés")
+        return
+    ingest_validations.ingest_validations(paths)
+
+def run_affluence(ctx):
     # 3. Calcul des features d'affluence sur les stations
-    run_script(os.path.join(BASE_DIR, "affluence_builder", "create_affluence.py"))
-    
-    # 4. (Optionnel) Ajoute ici d'autres étapes, ex: correspondances, enrichissement, QC...
-    # run_script(os.path.join(BASE_DIR, "mon_script_en_plus.py"))
-    
+    stations, _ = ctx.get("normalize")
+    return normalize_affluence_table(create_affluence.create_affluence(stations=stations))
+
+def load_affluence():
+    return load_affluence_table(AFFLUENCE_PATH)
+
+def run_tensor(ctx):
+    # 3b. Tenseur d'affluence [7 jours, 24 heures, noeuds] (affluence_tensor.npy, lu en memory-map)
+    net = ctx.get("graph")
+    tensor = affluence_tensor.build_affluence_tensor(net, ctx.get("affluence"))
+    affluence_tensor.save_affluence_tensor(tensor, net, AFFLUENCE_PATH)
+    print(f"Tenseur d'affluence {tensor.shape} exporté dans {affluence_tensor.TENSOR_PATH}")
+
+def run_route_table(ctx):
+    # 4. Table des routes précalculées (station x monument x jour/heure x curseur)
+    monuments = pd.read_csv(data("monuments.csv"), encoding='cp1252')["Monument"].tolist()
+    net = ctx.get("graph")
+    route_table.build_route_table(net, affluence_tensor.get_affluence_tensor(net, AFFLUENCE_PATH), monuments)
+
+def build_pipeline(workers=None):
+    """
+    DAG des étapes de préparation de data/ : dépendances déduites des fichiers lus et écrits.
+    Le code des étapes fait partie de leurs entrées (modifier un module relance ses étapes).
+    """
+    profiles = ingest_validations.PROFILES_PATH
+    stages = [
+        Stage(
+            "normalize", run_normalize, load=load_normalize,
+            inputs=[data("Stations_IDF.csv"), data("emplacement-des-gares-idf.csv")]
+                   + code("graph_builder/normalize.py", "blobia/names.py", "blobia/tables.py", "utils.py"),
+            outputs=[table("Stations_IDF_normalized.csv"), table("emplacement_des_gares_idf_normalized.csv"),
+                     table_path(STATIONS_ALIGNED), table_path(GARES_ALIGNED)],
+        ),
+        Stage(
+            "graph", run_graph, load=load_graph,
+            inputs=[table_path(STATIONS_ALIGNED), table_path(GARES_ALIGNED)]
+                   + code("graph_builder/build_graph.py", "blobia/network.py", "blobia/tables.py"),
+            outputs=[table("graph_nodes.csv"), table("stations_lignes_coords.csv"), table("graph_edges.csv"),
+                     GRAPH_PATH, NETWORK_DIR],
+        ),
+        Stage(
+            "chain_skip", run_chain_skip,
+            inputs=[NETWORK_META] + code("graph_builder/chain_skip.py", "blobia/network.py"),
+            outputs=[chain_skip.CHAIN_SKIP_PATH],
+        ),
+        Stage(
+            "validations", run_validations,
+            inputs=[ingest_validations.VALIDATIONS_DIR]
+                   + code("affluence_builder/ingest_validations.py", "graph_builder/normalize.py", "blobia/names.py", "utils.py"),
+            outputs=[profiles],
+        ),
+        Stage(
+            "affluence", run_affluence, load=load_affluence,
+            inputs=[table_path(STATIONS_ALIGNED), profiles]
+                   + code("affluence_builder/create_affluence.py", "blobia/names.py", "blobia/tables.py", "utils.py"),
+            outputs=[table_path(AFFLUENCE_PATH)],
+        ),
+        Stage(
+            "tensor", run_tensor,
+            inputs=[NETWORK_META, table_path(AFFLUENCE_PATH), profiles]
+                   + code("affluence_builder/affluence_tensor.py", "affluence_builder/get_affluence.py",
+                          "blobia/network.py", "blobia/tables.py"),
+            outputs=[affluence_tensor.TENSOR_PATH, os.path.splitext(affluence_tensor.TENSOR_PATH)[0] + ".json"],
+        ),
+        Stage(
+            "route_table", run_route_table,
+            inputs=[NETWORK_META, table_path(AFFLUENCE_PATH), profiles, affluence_tensor.TENSOR_PATH,
+                    data("monuments.csv"), table("graph_nodes.csv")]
+                   + code("blobia/route_table.py", "blobia/route_tree.py", "blobia/blob_solver.py", "blobia/pareto.py",
+                          "blobia/network.py", "blobia/mapping.py", "blobia/names.py", "blobia/tables.py",
+                          "affluence_builder/affluence_tensor.py", "affluence_builder/get_affluence.py"),
+            outputs=[route_table.TABLE_DIR],
+        ),
+        # 5. (Optionnel) Ajoute ici d'autres étapes, ex: correspondances, enrichissement, QC...
+    ]
+    return Pipeline(stages, workers=workers)
+
+def main(targets=None, force=False, workers=None, csv=False):
+    # Tables intermédiaires en colonnes (data/tables/) ; CSV de debug dans data/ sur demande
+    tables.EXPORT_CSV = tables.EXPORT_CSV or csv
+    report = build_pipeline(workers).run(targets, force=force)
+    print_report(report)
+    if any(status in (ECHEC, ANNULEE) for status, _ in report.values()):
+        print("\n[ERREUR] Pipeline de données interrompue.")
+        sys.exit(1)
     print("\n[PIPELINE] Pipeline de données terminée ! Les fichiers dans ./data sont à jour.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline de données Blob IA (étapes incrémentales)")
+    parser.add_argument("targets", nargs="*", help="étapes à mettre à jour (par défaut : toutes)")
+    parser.add_argument("--force", action="store_true", help="relance les étapes même à jour")
+    parser.add_argument("--workers", type=int, default=None, help="étapes exécutées en parallèle")
+    parser.add_argument("--csv", action="store_true", help="exporte aussi en CSV (debug) les tables des étapes exécutées (avec --force : toutes)")
+    args = parser.parse_args()
+    main(args.targets, force=args.force, workers=args.workers, csv=args.csv)
@@ -1,30 +1,79 @@
 import sys
 import os
+import hashlib
+import numpy as np
 import pandas as pd
 import networkx as nx
 import pickle
-from geopy.distance import geodesic
-import matplotlib.pyplot as plt
+
+# Ajoute le dossier parent au PYTHONPATH (exécution en script depuis data_pipeline.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from blobia.network import CompiledNetwork, save_network
+from blobia.tables import save_table, read_table, table_source
 
 # -- Répertoires --
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
-
-def build_nodes():
-    gares_path = os.path.join(DATA_DIR, "emplacement_des_gares_idf_aligned.csv")
-    gares = pd.read_csv(gares_path)
-    gares["latitude"] = gares["Geo Point"]
-    gares["longitude"] = gares["Geo Shape"]
-    nodes = gares[["gare_key", "nom_so_gar", "latitude", "longitude"]].drop_duplicates()
-    nodes.to_csv(os.path.join(DATA_DIR, "graph_nodes.csv"), index=False)
-    print(f"{len(nodes)} nœuds exportés dans graph_nodes.csv")
-
-def join_coords_to_stations():
-    stations_path = os.path.join(DATA_DIR, "Stations_IDF_aligned.csv")
-    nodes_path = os.path.join(DATA_DIR, "graph_nodes.csv")
-
-    stations = pd.read_csv(stations_path)
-    nodes = pd.read_csv(nodes_path)
+NETWORK_DIR_NAME = "graph_compiled"
+SOURCE_FILES = ("Stations_IDF_aligned.csv", "graph_nodes.csv")
+
+# -- Ellipsoïde WGS84 (celui de geopy.distance.geodesic) --
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+def ellipsoid_distance(lat1, lon1, lat2, lon2):
+    """
+    Distance en mètres entre deux tableaux de points, calculée en une passe NumPy sur l'ellipsoïde
+    WGS84 : rayons de courbure méridien et transverse pris à la latitude moyenne de chaque arête.
+    Ecart avec geopy.distance.geodesic : < 2 mm jusqu'à 10 km, < 0,25 m à 50 km.
+    NaN si une coordonnée manque.
+    """
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    dlon = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    dlon = (dlon + np.pi) % (2 * np.pi) - np.pi
+    phi_m = (phi1 + phi2) / 2
+    w = np.sqrt(1 - WGS84_E2 * np.sin(phi_m) ** 2)
+    n = WGS84_A / w                        # rayon de courbure transverse
+    m = WGS84_A * (1 - WGS84_E2) / w ** 3  # rayon de courbure méridien
+    return np.hypot(n * np.cos(phi_m) * dlon, m * (phi2 - phi1))
+
+def source_digest(data_dir=None):
+    """
+    Empreinte des fichiers d'entrée du graphe (enregistrée dans l'artefact binaire du réseau) :
+    tables en colonnes de data/tables/, ou CSV de data/ s'ils n'ont pas encore été convertis.
+    """
+    h = hashlib.sha1()
+    for name in SOURCE_FILES:
+        with open(table_source(os.path.join(data_dir or DATA_DIR, name)), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def build_nodes(gares=None):
+    """
+    Noeuds (gares géolocalisées) exportés dans la table graph_nodes ; gares alignées passées en
+    mémoire, ou relues depuis data/ (seulement les colonnes utiles).
+    """
+    if gares is None:
+        gares = read_table(
+            os.path.join(DATA_DIR, "emplacement_des_gares_idf_aligned.csv"),
+            columns=["gare_key", "nom_so_gar", "Geo Point", "Geo Shape"]
+        )
+    nodes = gares[["gare_key", "nom_so_gar", "Geo Point", "Geo Shape"]].rename(
+        columns={"Geo Point": "latitude", "Geo Shape": "longitude"}
+    ).drop_duplicates()
+    save_table(nodes, os.path.join(DATA_DIR, "graph_nodes.csv"))
+    print(f"{len(nodes)} nœuds exportés dans graph_nodes")
+    return nodes
+
+def join_coords_to_stations(stations=None, nodes=None):
+    if stations is None:
+        stations = read_table(os.path.join(DATA_DIR, "Stations_IDF_aligned.csv"))
+    if nodes is None:
+        nodes = read_table(os.path.join(DATA_DIR, "graph_nodes.csv"), columns=["gare_key", "latitude", "longitude"])
+    stations = stations.copy()
+    nodes = nodes.copy()
 
     stations["station_key"] = stations["station_key"].astype(str)
     nodes["gare_key"] = nodes["gare_key"].astype(str)
@@ -37,55 +86,47 @@ def join_coords_to_stations():
     )
     stations.drop(columns=["gare_key"], inplace=True)
 
-    stations.to_csv(os.path.join(DATA_DIR, "stations_lignes_coords.csv"), index=False)
+    save_table(stations, os.path.join(DATA_DIR, "stations_lignes_coords.csv"))
     return stations
 
-def build_graph():
-    stations = join_coords_to_stations()
+def build_graph(stations=None, nodes=None):
+    """
+    Graphe NetworkX (pickle, arêtes de debug) et réseau compilé à partir des stations alignées et
+    des noeuds, passés en mémoire ou relus depuis data/ ; renvoie le CompiledNetwork.
+    """
+    stations = join_coords_to_stations(stations, nodes)
+    stations["node_id"] = stations["station_key"] + "_" + stations["ligne"].astype(str)
 
     G = nx.Graph()
 
-    # -- Création des noeuds --
-    for _, row in stations.iterrows():
-        node_id = row['station_key'] + "_" + str(row['ligne'])
-        G.add_node(
-            node_id,
-            station_key=row['station_key'],
-            name=row['station'],
-            ligne=row['ligne'],
-            latitude=row['latitude'],
-            longitude=row['longitude']
-        )
+    # -- Création des noeuds (en bloc ; une station répétée garde les attributs de sa dernière ligne) --
+    attrs = stations[["node_id", "station_key", "station", "ligne", "latitude", "longitude"]]
+    G.add_nodes_from(
+        (node_id, {"station_key": key, "name": name, "ligne": ligne, "latitude": lat, "longitude": lon})
+        for node_id, key, name, ligne, lat, lon in zip(*(attrs[c].tolist() for c in attrs.columns))
+    )
 
-    # -- Ajout des arêtes "adjacence" sur la même ligne --
-    for ligne, group in stations.groupby("ligne"):
-        group_sorted = group.sort_values("ordre")
-        previous = None
-        for _, row in group_sorted.iterrows():
-            node_id = row['station_key'] + "_" + str(row['ligne'])
-            if previous is not None:
-                prev_id = previous['station_key'] + "_" + str(previous['ligne'])
-                coord1 = (previous['latitude'], previous['longitude'])
-                coord2 = (row['latitude'], row['longitude'])
-                if pd.notnull(coord1[0]) and pd.notnull(coord1[1]) and pd.notnull(coord2[0]) and pd.notnull(coord2[1]):
-                    distance = geodesic(coord1, coord2).meters
-                else:
-                    distance = None
-                G.add_edge(
-                    prev_id, node_id,
-                    type="adjacence",
-                    ligne=ligne,
-                    distance=distance
-                )
-            previous = row
-
-    # -- Ajout des arêtes de correspondance (synonymes) --
-    stations_by_key = stations.groupby('station_key')
-    for station_key, group in stations_by_key:
-        node_ids = [row['station_key'] + "_" + str(row['ligne']) for _, row in group.iterrows()]
-        for i, node_a in enumerate(node_ids):
-            for node_b in node_ids[i+1:]:
-                G.add_edge(node_a, node_b, type="correspondance", ligne=None, distance=0)
+    # -- Ajout des arêtes "adjacence" sur la même ligne : stations triées par (ligne, ordre),
+    # chaque station reliée à la précédente de sa ligne --
+    by_line = stations.sort_values(["ligne", "ordre"], kind="stable")
+    prev = by_line.shift(1)
+    same_line = (by_line["ligne"] == prev["ligne"]).to_numpy()
+    cur, prev = by_line[same_line], prev[same_line]
+    distance = ellipsoid_distance(prev["latitude"], prev["longitude"], cur["latitude"], cur["longitude"])
+    G.add_edges_from(
+        (u, v, {"type": "adjacence", "ligne": ligne, "distance": None if np.isnan(d) else d})
+        for u, v, ligne, d in zip(prev["node_id"].tolist(), cur["node_id"].tolist(), cur["ligne"].tolist(), distance.tolist())
+    )
+
+    # -- Ajout des arêtes de correspondance (synonymes) : toutes les paires de lignes d'une même
+    # station, par auto-jointure sur station_key --
+    rows = stations[["station_key", "node_id"]].reset_index(drop=True).rename_axis("rang").reset_index()
+    pairs = rows.merge(rows, on="station_key", suffixes=("_a", "_b"))
+    pairs = pairs[pairs["rang_a"] < pairs["rang_b"]]
+    G.add_edges_from(
+        (a, b, {"type": "correspondance", "ligne": None, "distance": 0})
+        for a, b in zip(pairs["node_id_a"].tolist(), pairs["node_id_b"].tolist())
+    )
 
     print(f"Graphe créé avec {G.number_of_nodes()} noeuds et {G.number_of_edges()} arêtes.")
 
@@ -100,16 +141,21 @@ def build_graph():
             "distance_m": data.get('distance', None)
         })
     edges_df = pd.DataFrame(edges)
-    edges_df.to_csv(os.path.join(DATA_DIR, "graph_edges.csv"), index=False)
-    print("Arêtes sauvegardées dans graph_edges.csv")
+    save_table(edges_df, os.path.join(DATA_DIR, "graph_edges.csv"))
+    print("Arêtes sauvegardées dans graph_edges")
 
     # -- Sauvegarde du graphe en pickle --
     with open(os.path.join(DATA_DIR, "graph_blobia.gpickle"), "wb") as f:
         pickle.dump(G, f)    
     print("Graphe sauvegardé en pickle : graph_blobia.gpickle")
 
+    # -- Artefact binaire versionné (memory-map) lu par les applications à la place du pickle --
+    net = CompiledNetwork.from_graph(G)
+    save_network(net, os.path.join(DATA_DIR, NETWORK_DIR_NAME), source_digest())
+    print(f"Réseau compilé sauvegardé : {NETWORK_DIR_NAME}/")
+    return net
+
 
 
 if __name__ == "__main__":
-    build_nodes()
-    build_graph()
+    build_graph(nodes=build_nodes())
@@ -0,0 +1,87 @@
+import os
+import sys
+import pickle
+import time
+
+# Ajoute le dossier parent au PYTHONPATH (exécution en script depuis data_pipeline.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from blobia.network import load_compiled_network
+
+# -- Répertoires --
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+CHAIN_SKIP_PATH = os.path.join(DATA_DIR, "graph_chain_skip.pkl")
+
+def is_dead_edge(net, u, v):
+    """
+    Arête qu'aucune recherche Blob ne peut emprunter :
+      - boucle sur un noeud (refusée par la règle anti-boucle 2)
+      - correspondance entre deux branches de la même ligne logique (règle 4)
+    """
+    if u == v:
+        return True
+    return (
+        net.station_of[u] == net.station_of[v]
+        and net.logical_of[u] == net.logical_of[v]
+        and net.line_of[u] != net.line_of[v]
+    )
+
+class ChainSkip:
+    """
+    Raccourci de parcours des chaînes de degré 2 d'un CompiledNetwork (ni hiérarchie de
+    contraction, ni arêtes de raccourci : le graphe n'est pas modifié).
+    Un noeud est "intermédiaire" s'il n'a que deux voisins utiles, tous deux sur sa ligne dans
+    d'autres stations : sans correspondance possible, une route qui y entre le traverse forcément.
+    next_hops[noeud] : les deux voisins de ligne d'un noeud intermédiaire (None sinon). La recherche
+    (compiled_path_solver) y développe une étiquette sans parcourir les arêtes du noeud ni recopier
+    l'état anti-boucle ; les étiquettes restent dépilées une à une, dans le même ordre que sans
+    raccourci (le score n'étant pas monotone, sauter une chaîne d'un coup changerait les
+    étiquettes écartées par dominance, donc les routes).
+    """
+
+    def __init__(self, fingerprint, next_hops):
+        self.fingerprint = fingerprint
+        self.next_hops = next_hops
+        self.n_intermediate = sum(h is not None for h in next_hops)
+
+def build_chain_skip(net):
+    neighbors = [
+        [v for v in net.successors[u] if not is_dead_edge(net, u, v)]
+        for u in range(net.n_nodes)
+    ]
+    next_hops = [
+        (nb[0], nb[1]) if len(nb) == 2 and all(
+            net.station_of[v] != net.station_of[u] and net.line_of[v] == net.line_of[u] for v in nb
+        ) else None
+        for u, nb in enumerate(neighbors)
+    ]
+    return ChainSkip(net.fingerprint(), next_hops)
+
+def save_chain_skip(chain_skip, path=CHAIN_SKIP_PATH):
+    with open(path, "wb") as f:
+        # Données brutes uniquement : le fichier ne dépend pas du module qui l'a écrit
+        pickle.dump({
+            "fingerprint": chain_skip.fingerprint,
+            "next_hops": chain_skip.next_hops,
+        }, f)
+
+def load_chain_skip(path, net):
+    """
+    Raccourci de chaînes sauvegardé, ou None si absent ou calculé pour un autre réseau.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        chain_skip = ChainSkip(**pickle.load(f))
+    if chain_skip.fingerprint != net.fingerprint():
+        print(f"[WARN] Raccourci de chaînes {path} calculé pour un autre réseau : ignoré")
+        return None
+    return chain_skip
+
+if __name__ == "__main__":
+    t0 = time.time()
+    net = load_compiled_network(os.path.join(DATA_DIR, "graph_compiled"), os.path.join(DATA_DIR, "graph_blobia.gpickle"))
+    chain_skip = build_chain_skip(net)
+    save_chain_skip(chain_skip)
+    print(f"Raccourci de chaînes : {chain_skip.n_intermediate} noeuds intermédiaires sur {net.n_nodes} "
+          f"({time.time() - t0:.1f}s)")
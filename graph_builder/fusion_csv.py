@@ -1,49 +1,26 @@
 import sys
 import os
 import pandas as pd
-import unidecode
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils import correspondances_physiques_groupes
+from blobia.names import normalize_name, normalize_names
+from graph_builder.normalize import build_synonym_mapping, map_names_to_master
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-def normalize_station_name(name):
-    if pd.isnull(name):
-        return ""
-    name = unidecode.unidecode(str(name))
-    name = name.lower()
-    name = name.replace("-", " ")
-    name = name.replace("’", "'").replace("`", "'").replace("–", " ")
-    name = " ".join(name.split())
-    return name.strip()
-
-def build_synonym_mapping(correspondance_groupes, normalizer):
-    mapping = {}
-    for groupe in correspondance_groupes:
-        if not groupe:
-            continue
-        master = normalizer(groupe[0])
-        for alias in groupe:
-            mapping[normalizer(alias)] = master
-    return mapping
-
-def map_to_master(name, mapping, normalizer):
-    norm = normalizer(name)
-    return mapping.get(norm, norm)
-
 if __name__ == "__main__":
     stations = pd.read_csv(os.path.join(DATA_DIR, "Stations_IDF.csv"))
     gares = pd.read_csv(os.path.join(DATA_DIR, "emplacement-des-gares-idf.csv"))
 
     # Normalisation pour jointure temporaire
-    stations["station_norm"] = stations["station"].apply(normalize_station_name)
-    gares["nom_so_gar_norm"] = gares["nom_so_gar"].apply(normalize_station_name)
+    stations["station_norm"] = normalize_names(stations["station"])
+    gares["nom_so_gar_norm"] = normalize_names(gares["nom_so_gar"])
 
-    synonym_mapping = build_synonym_mapping(correspondances_physiques_groupes, normalize_station_name)
-    stations["station_key"] = stations["station_norm"].apply(lambda n: map_to_master(n, synonym_mapping, lambda x: x))
-    gares["gare_key"] = gares["nom_so_gar_norm"].apply(lambda n: map_to_master(n, synonym_mapping, lambda x: x))
+    synonym_mapping = build_synonym_mapping(correspondances_physiques_groupes, normalize_name)
+    stations["station_key"] = map_names_to_master(stations["station_norm"], synonym_mapping)
+    gares["gare_key"] = map_names_to_master(gares["nom_so_gar_norm"], synonym_mapping)
 
     # On prend latitude/longitude des colonnes correspondantes
     gares['latitude'] = pd.to_numeric(gares['Geo Point'], errors='coerce')
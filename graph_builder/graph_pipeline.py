@@ -1,8 +1,12 @@
-import subprocess
+import os
+import sys
 
-def run():
-    subprocess.run(['python', 'graph_builder/normalize.py'], check=True)
-    subprocess.run(['python', 'graph_builder/build_graph.py'], check=True)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import data_pipeline
+
+def run(force=False):
+    # Normalisation puis construction du graphe, sans relancer les étapes à jour
+    data_pipeline.main(["graph"], force=force)
 
 if __name__ == '__main__':
     run()
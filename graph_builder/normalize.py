@@ -3,35 +3,30 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils import correspondances_physiques_groupes
+from blobia.tables import save_table, read_table
+from blobia.names import normalize_name, normalize_names
 import pandas as pd
-import unidecode
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-def normalize_station_name(name):
-    if name is None:
-        return ""
-    name = unidecode.unidecode(str(name))
-    name = name.lower()
-    name = name.replace("-", " ")
-    name = name.replace("’", "'").replace("`", "'").replace("–", " ")
-    name = " ".join(name.split())
-    return name.strip()
-
 def normalize_tables():
+    """
+    Ajoute les noms normalisés aux deux tables sources ; renvoie (stations, gares).
+    """
     stations_path = os.path.join(DATA_DIR, 'Stations_IDF.csv')
     gares_path = os.path.join(DATA_DIR, 'emplacement-des-gares-idf.csv')
 
     stations = pd.read_csv(stations_path)
     gares = pd.read_csv(gares_path)
 
-    stations["station_norm"] = stations["station"].apply(normalize_station_name)
-    gares["nom_so_gar_norm"] = gares["nom_so_gar"].apply(normalize_station_name)
+    stations["station_norm"] = normalize_names(stations["station"])
+    gares["nom_so_gar_norm"] = normalize_names(gares["nom_so_gar"])
 
-    stations.to_csv(os.path.join(DATA_DIR, "Stations_IDF_normalized.csv"), index=False)
-    gares.to_csv(os.path.join(DATA_DIR, "emplacement_des_gares_idf_normalized.csv"), index=False)
-    print("Colonnes normalisées créées et fichiers sauvegardés.")
+    save_table(stations, os.path.join(DATA_DIR, "Stations_IDF_normalized.csv"))
+    save_table(gares, os.path.join(DATA_DIR, "emplacement_des_gares_idf_normalized.csv"))
+    print("Colonnes normalisées créées et tables sauvegardées.")
+    return stations, gares
 
 def build_synonym_mapping(correspondance_groupes, normalizer):
     mapping = {}
@@ -43,26 +38,34 @@ def build_synonym_mapping(correspondance_groupes, normalizer):
             mapping[normalizer(alias)] = master
     return mapping
 
-def map_to_master(name, mapping, normalizer):
-    norm = normalizer(name)
-    return mapping.get(norm, norm)
+def map_names_to_master(names, mapping):
+    """
+    Nom maître de chaque nom (déjà normalisé) d'une Series ; inchangé s'il n'a pas de synonyme.
+    """
+    return names.map(mapping).fillna(names)
 
-def align_tables_with_synonyms():
-    synonym_mapping = build_synonym_mapping(correspondances_physiques_groupes, normalize_station_name)
+def align_tables_with_synonyms(stations=None, gares=None):
+    """
+    Ajoute station_key / gare_key (nom maître du groupe de synonymes) ; renvoie (stations, gares).
+    Tables normalisées passées en mémoire, ou relues depuis data/tables/ si absentes.
+    """
+    synonym_mapping = build_synonym_mapping(correspondances_physiques_groupes, normalize_name)
 
-    stations = pd.read_csv(os.path.join(DATA_DIR, "Stations_IDF_normalized.csv"))
-    gares = pd.read_csv(os.path.join(DATA_DIR, "emplacement_des_gares_idf_normalized.csv"))
+    if stations is None:
+        stations = read_table(os.path.join(DATA_DIR, "Stations_IDF_normalized.csv"))
+    if gares is None:
+        gares = read_table(os.path.join(DATA_DIR, "emplacement_des_gares_idf_normalized.csv"))
 
-    stations["station_key"] = stations["station_norm"].apply(lambda n: map_to_master(n, synonym_mapping, lambda x: x))
-    gares["gare_key"] = gares["nom_so_gar_norm"].apply(lambda n: map_to_master(n, synonym_mapping, lambda x: x))
+    stations["station_key"] = map_names_to_master(stations["station_norm"], synonym_mapping)
+    gares["gare_key"] = map_names_to_master(gares["nom_so_gar_norm"], synonym_mapping)
 
-    stations.to_csv(os.path.join(DATA_DIR, "Stations_IDF_aligned.csv"), index=False)
-    gares.to_csv(os.path.join(DATA_DIR, "emplacement_des_gares_idf_aligned.csv"), index=False)
+    save_table(stations, os.path.join(DATA_DIR, "Stations_IDF_aligned.csv"))
+    save_table(gares, os.path.join(DATA_DIR, "emplacement_des_gares_idf_aligned.csv"))
 
     n_aligned = (stations["station_norm"] != stations["station_key"]).sum()
     print(f"Mapping synonymes appliqué : {n_aligned} noms de stations alignés.")
-    print("Colonnes 'station_key' et 'gare_key' créées et fichiers sauvegardés.")
+    print("Colonnes 'station_key' et 'gare_key' créées et tables sauvegardées.")
+    return stations, gares
 
 if __name__ == "__main__":
-    normalize_tables()
-    align_tables_with_synonyms()
+    align_tables_with_synonyms(*normalize_tables())
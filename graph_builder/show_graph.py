@@ -1,16 +1,20 @@
 import os
+import sys
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 from matplotlib.cm import get_cmap
 from geopy.distance import geodesic
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from blobia.tables import read_table
+
 def visualize_graph():
     BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     DATA_DIR = os.path.join(BASE_DIR, 'data')
     stations_path = os.path.join(DATA_DIR, 'stations_lignes_coords.csv')
 
-    stations = pd.read_csv(stations_path)
+    stations = read_table(stations_path, columns=["station_key", "station", "ligne", "ordre", "latitude", "longitude"])
 
     G = nx.Graph()
     for _, row in stations.iterrows():
@@ -1,11 +1,19 @@
 import os
-import pickle
-import pandas as pd
-import networkx as nx
+import sys
+import csv
+import json
+import time
+import argparse
 
-from blobia.mapping import normalize_name, find_stations_near_monument
-from affluence_builder.get_affluence import get_affluence_mapping_from_file
-from blobia.route import find_best_route
+from blobia.mapping import find_stations_near_monument
+from blobia.names import normalize_name, normalize_names
+from affluence_builder.get_affluence import load_affluence_table
+from blobia.tables import read_table
+from affluence_builder.affluence_tensor import get_affluence_tensor, slot_index
+from blobia.route import find_best_route, find_best_routes_batch
+from blobia.route_table import load_route_table
+from blobia.network import load_compiled_network
+from graph_builder.chain_skip import load_chain_skip
 from blobia.show_route import format_route
 
 DEPART_STR = "Aulnay sous Bois"
@@ -13,12 +21,15 @@ MONUMENT_STR = "Arena Paris Sud"
 JOUR = "lundi"
 HEURE = 8
 
-def main():
+def main(horaire=False):
     BASE = os.path.dirname(os.path.abspath(__file__))
     graph_path = os.path.join(BASE, "data", "graph_blobia.gpickle")
+    network_dir = os.path.join(BASE, "data", "graph_compiled")
     affluence_path = os.path.join(BASE, "data", "Stations_IDF_aligned_affluence.csv")
     monuments_csv = os.path.join(BASE, "data", "monuments.csv")
     stations_csv = os.path.join(BASE, "data", "graph_nodes.csv")
+    route_table_dir = os.path.join(BASE, "data", "route_table")
+    chain_skip_path = os.path.join(BASE, "data", "graph_chain_skip.pkl")
 
     print("==== Planificateur de trajet Métro/RER Blob IA ====\n")
     print(f"Départ : {DEPART_STR} | Arrivée : {MONUMENT_STR} | Jour : {JOUR} | Heure : {HEURE}h\n")
@@ -31,20 +42,25 @@ def main():
 
     print("\nChargement du graphe…")
     try:
-        with open(graph_path, "rb") as f:
-            G = pickle.load(f)
+        # Réseau compilé en memory-map (artefact de build_graph.py), sinon pickle NetworkX
+        net = load_compiled_network(network_dir, graph_path)
     except Exception as e:
         print(f"Erreur lors du chargement du graphe : {e}")
         return
     try:
-        afflu_map = get_affluence_mapping_from_file(affluence_path, JOUR, HEURE)
-        afflu_df = pd.read_csv(affluence_path)  # Pour lier station -> ligne
+        # Affluence par noeud du créneau demandé (tenseur précalculé par la pipeline),
+        # ou tenseur complet en mode horaire (affluence à l'heure d'arrivée à chaque arrêt)
+        afflu_tensor = get_affluence_tensor(net, affluence_path)
+        afflu_vec = afflu_tensor if horaire else afflu_tensor[slot_index(JOUR, HEURE)]
+        afflu_df = read_table(affluence_path, columns=["station_key", "ligne"])  # Pour lier station -> ligne
     except Exception as e:
         print(f"Erreur lors du chargement de l'affluence : {e}")
         return
+    route_table = load_route_table(route_table_dir, net, afflu_tensor)
+    chain_skip = load_chain_skip(chain_skip_path, net)
 
     dep_norm = normalize_name(DEPART_STR)
-    dep_node_ids = [n for n, d in G.nodes(data=True) if normalize_name(d.get("station_key", "")) == dep_norm]
+    dep_node_ids = [n for n, s in zip(net.node_names, net.station_of) if normalize_name(net.station_names[s]) == dep_norm]
     if not dep_node_ids:
         print(f"Départ « {DEPART_STR} » introuvable dans le graphe.")
         return
@@ -65,9 +81,10 @@ def main():
 
     # Pour chaque station proche, trouve TOUTES ses lignes, ne garde que la plus proche par ligne
     line_to_station = dict()  # {ligne: (station_key, distance)}
+    afflu_keys = normalize_names(afflu_df["station_key"])
     for st, dist in arr_candidates:
         # Pour chaque ligne associée à cette station dans afflu_df
-        for _, row in afflu_df[afflu_df["station_key"].apply(lambda x: normalize_name(str(x)) == normalize_name(st))].iterrows():
+        for _, row in afflu_df[afflu_keys == normalize_name(st)].iterrows():
             line = str(row["ligne"])
             if (line not in line_to_station) or (dist < line_to_station[line][1]):
                 line_to_station[line] = (normalize_name(st), dist)
@@ -79,25 +96,32 @@ def main():
     # On construit les node_ids d'arrivée
     arr_node_ids = []
     arr_debug = []
-    for node, data in G.nodes(data=True):
-        skey = normalize_name(data.get("station_key", ""))
-        line = str(data.get("ligne", ""))
+    for node, s, l, name in zip(net.node_names, net.station_of, net.line_of, net.display_names):
+        skey = normalize_name(net.station_names[s])
+        line = str(net.line_names[l])
         if skey in arr_station_keys and line in arr_lines:
             arr_node_ids.append(node)
-            arr_debug.append(f"{data.get('name', skey)} ({line})")
+            arr_debug.append(f"{name} ({line})")
 
     if not arr_node_ids:
         print(f"Aucune station d’arrivée trouvée près du monument « {MONUMENT_STR} ».")
         return
 
     print("\nCalcul du meilleur trajet (algorithme Blob)...")
-    result = find_best_route(
-        G=G,
-        affluence_mapping=afflu_map,
+    result, stats = find_best_route(
+        G=net,
+        affluence_mapping=afflu_vec,
         station_depart=dep_norm,
         list_stations_arrivee=arr_station_keys,
         curseur=curseur,
-        verbose=True
+        verbose=True,
+        route_table=route_table,
+        monument=MONUMENT_STR,
+        jour=JOUR,
+        heure=HEURE,
+        chain_skip=chain_skip,
+        return_stats=True,
+        horaire=horaire
     )
 
     if result:
@@ -107,5 +131,99 @@ def main():
     else:
         print("Aucun trajet trouvé entre les points sélectionnés.")
 
+    print("\n--- Statistiques de la recherche ---\n")
+    print(stats)
+
+# -- Mode batch : requêtes lues dans un fichier (ou stdin), résultats JSONL au fil de l'eau --
+
+BATCH_FIELDS = ("depart", "monument", "jour", "heure", "curseur")
+
+def read_queries(source, fmt=None):
+    """
+    Génère les requêtes (depart, monument, jour, heure, curseur) d'un fichier CSV ou JSONL
+    (colonnes / clés de BATCH_FIELDS). source "-" : entrée standard (JSONL par défaut).
+    Une ligne JSONL illisible donne une ValueError à sa place (erreur de cette requête seule).
+    """
+    if fmt is None:
+        fmt = "csv" if source.lower().endswith(".csv") else "jsonl"
+    f = sys.stdin if source == "-" else open(source, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield tuple(row.get(k) for k in BATCH_FIELDS)
+            return
+        for i, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"ligne {i} : JSON invalide ({e})")
+                continue
+            if not isinstance(row, dict):
+                yield ValueError(f"ligne {i} : objet JSON attendu")
+                continue
+            yield tuple(row.get(k) for k in BATCH_FIELDS)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def run_batch(source, output="-", fmt=None, workers=None, horaire=False):
+    BASE = os.path.dirname(os.path.abspath(__file__))
+    graph_path = os.path.join(BASE, "data", "graph_blobia.gpickle")
+    network_dir = os.path.join(BASE, "data", "graph_compiled")
+    affluence_path = os.path.join(BASE, "data", "Stations_IDF_aligned_affluence.csv")
+    route_table_dir = os.path.join(BASE, "data", "route_table")
+    chain_skip_path = os.path.join(BASE, "data", "graph_chain_skip.pkl")
+
+    # Graphe et affluence chargés une seule fois pour tout le lot
+    net = load_compiled_network(network_dir, graph_path)
+    afflu_df = load_affluence_table(affluence_path)
+    afflu_tensor = get_affluence_tensor(net, affluence_path)
+    chain_skip = load_chain_skip(chain_skip_path, net)
+
+    out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+    t0 = time.time()
+    n = ok = erreurs = 0
+    try:
+        for query, routes, erreur in find_best_routes_batch(
+            net, afflu_df, read_queries(source, fmt), affluence_tensor=afflu_tensor, workers=workers,
+            route_table_dir=route_table_dir, chain_skip=chain_skip, horaire=horaire
+        ):
+            n += 1
+            if erreur is None:
+                ok += 1
+            else:
+                erreurs += 1
+            record = dict(zip(BATCH_FIELDS, query if isinstance(query, tuple) else (None,) * len(BATCH_FIELDS)))
+            record["routes"] = routes
+            record["erreur"] = erreur
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if n % 100 == 0:
+                print(f"[BATCH] {n} requêtes ({n / (time.time() - t0):.1f}/s)", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    duree = time.time() - t0
+    print(
+        f"[BATCH] {n} requêtes en {duree:.1f}s ({n / duree if duree > 0 else 0:.1f}/s) : "
+        f"{ok} réussies, {erreurs} en erreur",
+        file=sys.stderr
+    )
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Planificateur de trajet Métro/RER Blob IA")
+    parser.add_argument("--batch", metavar="FICHIER",
+                        help="requêtes CSV/JSONL (depart, monument, jour, heure, curseur), '-' pour stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="format des requêtes (déduit de l'extension)")
+    parser.add_argument("--output", default="-", help="fichier JSONL de sortie (stdout par défaut)")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus (tous les coeurs par défaut)")
+    parser.add_argument("--horaire", action="store_true",
+                        help="affluence de chaque arrêt à l'heure estimée d'arrivée (et non à l'heure de départ)")
+    args = parser.parse_args()
+    if args.batch:
+        run_batch(args.batch, output=args.output, fmt=args.format, workers=args.workers, horaire=args.horaire)
+    else:
+        main(horaire=args.horaire)
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+STATE_PATH = os.path.join(BASE_DIR, "data", ".pipeline_state.json")
+STATE_VERSION = 1
+
+EXECUTEE = "exécutée"
+A_JOUR = "à jour"
+ECHEC = "échec"
+ANNULEE = "annulée"
+
+# -- Empreintes des fichiers --
+
+def _walk(path):
+    """
+    Fichiers d'une entrée : le fichier lui-même, ou tous les fichiers d'un répertoire (triés).
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__" and not d.startswith("."))
+        files.extend(os.path.join(root, n) for n in sorted(names) if not n.startswith("."))
+    return files
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+class Stage:
+    """
+    Etape de la pipeline :
+      - run(ctx) : calcule l'étape ; sa valeur de retour est transmise en mémoire aux étapes suivantes (ctx.get)
+      - inputs / outputs : fichiers ou répertoires lus / écrits (code source de l'étape compris dans inputs)
+      - load() : relit la valeur de l'étape depuis ses sorties quand elle est à jour et n'a pas tourné
+    Les dépendances se déduisent des fichiers : une étape dépend de celles qui écrivent ses entrées.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), load=None):
+        self.name = name
+        self.run = run
+        self.inputs = [os.path.abspath(p) for p in inputs]
+        self.outputs = [os.path.abspath(p) for p in outputs]
+        self.load = load
+
+    def produces(self, path):
+        return any(path == out or path.startswith(out + os.sep) or out.startswith(path + os.sep)
+                   for out in self.outputs)
+
+class Context:
+    """
+    Valeurs des étapes amont, transmises en mémoire ; relues depuis le disque (Stage.load)
+    seulement si l'étape était à jour et qu'une étape aval en a besoin.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self.values:
+                load = self.stages[name].load
+                self.values[name] = load() if load is not None else None
+            return self.values[name]
+
+    def put(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+class Pipeline:
+    """
+    Pipeline incrémentale en DAG, exécutée dans le processus courant :
+      - une étape ne tourne que si l'empreinte (sha1 du contenu) de ses entrées a changé, ou si
+        ses sorties ont disparu ou été modifiées depuis sa dernière exécution
+      - les étapes indépendantes tournent en parallèle (workers threads)
+      - l'état (empreintes des entrées et des sorties, cache des sha1) est gardé dans state_path
+    """
+
+    def __init__(self, stages, state_path=STATE_PATH, workers=None):
+        self.stages = {s.name: s for s in stages}
+        self.order = [s.name for s in stages]
+        self.state_path = state_path
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.deps = {
+            s.name: [o.name for o in stages if o is not s and any(o.produces(p) for p in s.inputs)]
+            for s in stages
+        }
+        self._lock = threading.Lock()
+        self.state = self._load_state()
+
+    # -- Etat --
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not state or state.get("version") != STATE_VERSION:
+            state = {"version": STATE_VERSION, "stages": {}, "files": {}}
+        return state
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def _file_hash(self, path):
+        """
+        sha1 du contenu, relu seulement si la date ou la taille du fichier a changé.
+        """
+        sig = _signature(path)
+        with self._lock:
+            cached = self.state["files"].get(path)
+        if cached is not None and cached[:2] == sig:
+            return cached[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        with self._lock:
+            self.state["files"][path] = sig + [h.hexdigest()]
+        return h.hexdigest()
+
+    def input_digest(self, stage):
+        h = hashlib.sha1()
+        for path in stage.inputs:
+            h.update(path.encode("utf-8"))
+            if not os.path.exists(path):
+                h.update(b"\0absent")
+            for file in _walk(path) if os.path.exists(path) else []:
+                h.update(os.path.relpath(file, path).encode("utf-8"))
+                h.update(self._file_hash(file).encode("ascii"))
+        return h.hexdigest()
+
+    def output_signature(self, stage):
+        return {
+            path: [[os.path.relpath(f, path)] + _signature(f) for f in _walk(path)] if os.path.exists(path) else None
+            for path in stage.outputs
+        }
+
+    # -- Exécution --
+
+    def selection(self, targets=None):
+        """
+        Etapes à considérer : les cibles et tout ce dont elles dépendent (toutes si targets est None).
+        """
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.stages]
+        if unknown:
+            raise ValueError(f"Etapes inconnues : {unknown} (disponibles : {self.order})")
+        selected = set()
+        todo = list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in selected:
+                selected.add(name)
+                todo.extend(self.deps[name])
+        return [name for name in self.order if name in selected]
+
+    def _run_stage(self, name, ctx, force):
+        stage = self.stages[name]
+        t0 = time.perf_counter()
+        digest = self.input_digest(stage)
+        with self._lock:
+            previous = self.state["stages"].get(name)
+        if (not force and previous is not None and previous["inputs"] == digest
+                and previous["outputs"] == self.output_signature(stage)):
+            return A_JOUR, time.perf_counter() - t0
+
+        print(f"\n[PIPELINE] Exécution de : {name}")
+        try:
+            value = stage.run(ctx)
+        except Exception as e:
+            print(f"[ERREUR] L'étape {name} a échoué : {e!r}")
+            return ECHEC, time.perf_counter() - t0
+        ctx.put(name, value)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.state["stages"][name] = {
+                "inputs": digest,
+                "outputs": self.output_signature(stage),
+                "duree_s": round(elapsed, 3),
+            }
+            self._save_state()
+        print(f"[OK] {name} terminée ({elapsed:.1f}s)")
+        return EXECUTEE, elapsed
+
+    def run(self, targets=None, force=False):
+        """
+        Exécute les étapes sélectionnées dans l'ordre du DAG.
+        Renvoie { étape: (statut, durée en secondes) } ; une étape dont une dépendance a échoué est annulée.
+        """
+        names = self.selection(targets)
+        ctx = Context(self.stages)
+        report = {}
+        pending = list(names)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = [d for d in self.deps[name] if d in names]
+                    if any(report.get(d, (None,))[0] in (ECHEC, ANNULEE) for d in deps):
+                        report[name] = (ANNULEE, 0.0)
+                        pending.remove(name)
+                    elif all(d in report for d in deps):
+                        running[pool.submit(self._run_stage, name, ctx, force)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report[running.pop(future)] = future.result()
+        with self._lock:
+            self._save_state()
+        return {name: report[name] for name in names}
+
+def print_report(report):
+    print("\n[PIPELINE] Bilan des étapes :")
+    for name, (status, elapsed) in report.items():
+        print(f"  {name:<20s} {status:<10s} {elapsed:8.2f}s")
+    print(f"  {'total':<20s} {'':<10s} {sum(e for _, e in report.values()):8.2f}s")
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+from affluence_builder.affluence_tensor import get_affluence_tensor, TENSOR_PATH
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.names import normalize_name
+from blobia.network import load_compiled_network
+from blobia.route import find_best_route, check_query, DATA_FILES
+from blobia.route_table import load_route_table
+from blobia.tables import table_path
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE, "data")
+GRAPH_PATH = os.path.join(DATA_DIR, "graph_blobia.gpickle")
+NETWORK_DIR = os.path.join(DATA_DIR, "graph_compiled")
+AFFLUENCE_PATH = os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv")
+MONUMENTS_CSV = os.path.join(DATA_DIR, "monuments.csv")
+STATIONS_CSV = os.path.join(DATA_DIR, "graph_nodes.csv")
+ROUTE_TABLE_DIR = os.path.join(DATA_DIR, "route_table")
+
+# -- Données résidentes (un instantané par version des fichiers de data/) --
+
+# Fichiers lus par load_snapshot et par la recherche des stations d'arrivée
+SNAPSHOT_FILES = DATA_FILES + (
+    TENSOR_PATH,
+    os.path.splitext(TENSOR_PATH)[0] + ".json",
+    MONUMENTS_CSV,
+    STATIONS_CSV,
+    table_path(STATIONS_CSV),
+)
+
+def data_signature():
+    paths = list(SNAPSHOT_FILES)
+    if os.path.isdir(ROUTE_TABLE_DIR):
+        paths += [os.path.join(ROUTE_TABLE_DIR, name) for name in sorted(os.listdir(ROUTE_TABLE_DIR))]
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None))
+    return tuple(sig)
+
+def load_snapshot():
+    """
+    Graphe compilé, tenseur d'affluence [7, 24, n_noeuds] et table de routes, chargés une fois.
+    """
+    net = load_compiled_network(NETWORK_DIR, GRAPH_PATH)
+    affluence = get_affluence_tensor(net, AFFLUENCE_PATH)
+    return {
+        "net": net,
+        "affluence": affluence,
+        "route_table": load_route_table(ROUTE_TABLE_DIR, net, affluence),
+        "arrivals": {},
+    }
+
+# -- Processus de calcul : un instantané par processus, rechargé avec le pool --
+_worker = {}
+
+def _init_worker():
+    _worker.update(load_snapshot())
+
+def _route(station_depart, arr_station_keys, slot, monument, jour, heure, curseur, horaire):
+    return find_best_route(
+        _worker["net"],
+        _worker["affluence"] if horaire else _worker["affluence"][slot],
+        station_depart,
+        arr_station_keys,
+        curseur=curseur,
+        route_table=_worker["route_table"],
+        monument=monument,
+        jour=jour,
+        heure=heure,
+        horaire=horaire
+    )
+
+class RoutingService:
+    """
+    Service HTTP/JSON local (asyncio) autour de find_best_route :
+      - GET /route?depart=...&monument=...&jour=...&heure=...&curseur=...&horaire=0|1 (ou POST du même JSON)
+      - GET /health, GET /metrics
+    Les requêtes identiques en cours de calcul partagent le même calcul ; les recherches tournent
+    dans un pool de processus. Quand la pipeline réécrit data/, un nouvel instantané est chargé
+    (nouveau pool) sans interrompre les requêtes en cours.
+    """
+
+    def __init__(self, workers=None, reload_interval=5.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.reload_interval = reload_interval
+        self.inflight = {}
+        self.latencies = deque(maxlen=2048)
+        self.counters = {"requetes": 0, "regroupees": 0, "calculs": 0, "erreurs": 0, "rechargements": 0}
+        self.started = time.time()
+        self.snapshot = None
+        self.pool = None
+        self.signature = None
+
+    # -- Instantané des données --
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        signature = data_signature()
+        snapshot = await loop.run_in_executor(None, load_snapshot)
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        old_pool = self.pool
+        self.snapshot, self.pool, self.signature = snapshot, pool, signature
+        self.inflight = {}
+        if old_pool is not None:
+            self.counters["rechargements"] += 1
+            old_pool.shutdown(wait=False)
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if data_signature() != self.signature:
+                try:
+                    await self.load()
+                    print("[SERVICE] Nouvel instantané des données chargé")
+                except Exception as e:
+                    print(f"[SERVICE] Rechargement impossible, ancien instantané conservé : {e}")
+
+    # -- Routage --
+
+    def _query(self, params):
+        depart = params.get("depart")
+        monument = params.get("monument")
+        jour, heure, curseur, slot = check_query(
+            depart, monument, params.get("jour", "lundi"), params.get("heure", 8), params.get("curseur", 5)
+        )
+        horaire = str(params.get("horaire", "0")).lower() in ("1", "true", "oui")
+        return (normalize_name(depart), slot, monument, jour, heure, curseur, horaire)
+
+    async def _arrivals(self, monument):
+        """
+        Stations d'arrivée du monument, cherchées une fois par instantané dans un thread
+        (lecture des CSV et calcul des distances hors de la boucle asyncio). Seules les recherches
+        réussies restent en cache : un nom de monument inconnu n'y laisse pas d'entrée.
+        """
+        arrivals = self.snapshot["arrivals"]
+        future = arrivals.get(monument)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = arrivals[monument] = loop.run_in_executor(None, functools.partial(
+                arrival_nodes_near_monument,
+                self.snapshot["net"], monument, monuments_csv=MONUMENTS_CSV, stations_csv=STATIONS_CSV
+            ))
+        try:
+            stations = (await asyncio.shield(future))[0]
+        except Exception:
+            if arrivals.get(monument) is future:
+                del arrivals[monument]
+            raise
+        if not stations:
+            if arrivals.get(monument) is future:
+                del arrivals[monument]
+            raise ValueError(f"Aucune station d'arrivée trouvée près du monument « {monument} »")
+        return tuple(stations)
+
+    async def route(self, params):
+        depart, slot, monument, jour, heure, curseur, horaire = self._query(params)
+        query = (depart, await self._arrivals(monument), slot, monument, jour, heure, curseur, horaire)
+        future = self.inflight.get(query)
+        if future is not None:
+            self.counters["regroupees"] += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, _route, *query)
+        self.inflight[query] = future
+        self.counters["calculs"] += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self.inflight.get(query) is future:
+                del self.inflight[query]
+
+    def metrics(self):
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else None
+
+        return dict(
+            self.counters,
+            en_cours=len(self.inflight),
+            workers=self.workers,
+            uptime_s=time.time() - self.started,
+            latence_ms={"p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99), "max": lat[-1] if lat else None},
+        )
+
+    # -- HTTP --
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok" if self.snapshot is not None else "chargement"}
+        if url.path == "/metrics":
+            return 200, self.metrics()
+        if url.path == "/route":
+            t0 = time.perf_counter()
+            self.counters["requetes"] += 1
+            try:
+                params = dict(parse_qsl(url.query))
+                if method == "POST" and body:
+                    try:
+                        payload = json.loads(body)
+                    except ValueError:
+                        raise ValueError("Corps de requête JSON invalide")
+                    if not isinstance(payload, dict):
+                        raise ValueError("Le corps de la requête doit être un objet JSON")
+                    params.update(payload)
+                routes = await self.route(params)
+            except ValueError as e:
+                self.counters["erreurs"] += 1
+                return 400, {"erreur": str(e)}
+            self.latencies.append((time.perf_counter() - t0) * 1000.0)
+            return 200, {"routes": routes}
+        return 404, {"erreur": f"Chemin inconnu : {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {"erreur": str(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        await self.load()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"[SERVICE] Blob IA en écoute sur http://{host}:{port} ({self.workers} processus)")
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.pool.shutdown(wait=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service HTTP local de calcul d'itinéraires Blob IA")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus de calcul")
+    parser.add_argument("--reload-interval", type=float, default=5.0, help="vérification de data/ (secondes)")
+    args = parser.parse_args()
+    asyncio.run(RoutingService(workers=args.workers, reload_interval=args.reload_interval).serve(args.host, args.port))
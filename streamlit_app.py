@@ -1,33 +1,40 @@
 import streamlit as st
 import pandas as pd
-import pickle
 import os
 import re
 import numpy as np
 import plotly.graph_objects as go
-import networkx as nx
 
 
-from blobia.mapping import normalize_name, find_stations_near_monument
-from affluence_builder.get_affluence import get_affluence_mapping_from_file
-from blobia.route import find_best_route
+from blobia.mapping import find_stations_near_monument
+from blobia.names import normalize_name, normalize_names
+from affluence_builder.affluence_tensor import get_affluence_tensor, slot_index
+from blobia.route import find_routes_all_curseurs
+from blobia.route_table import load_route_table
+from blobia.network import load_compiled_network
+from blobia.tables import read_table
 from blobia.show_route import format_route
 
 
 # ----------- Fonctions utilitaires cache et fichiers -----------
 
-@st.cache_data(show_spinner="Chargement du graphe…")
-def load_graph(graph_path):
-    with open(graph_path, "rb") as f:
-        return pickle.load(f)
+@st.cache_resource(show_spinner="Chargement du graphe…")
+def load_graph(network_dir, graph_path):
+    # Réseau compilé en memory-map (artefact de build_graph.py), partagé entre les sessions
+    return load_compiled_network(network_dir, graph_path)
 
-@st.cache_data(show_spinner="Chargement de l'affluence…")
-def load_affluence(affluence_path, jour, heure):
-    return get_affluence_mapping_from_file(affluence_path, jour, heure)
+@st.cache_resource(show_spinner="Chargement de la table de routes…")
+def load_routes(route_table_dir, _net, _affluence):
+    return load_route_table(route_table_dir, _net, _affluence)
+
+@st.cache_resource(show_spinner="Chargement de l'affluence…")
+def load_affluence(affluence_path, _net):
+    # Tenseur [7, 24, n_noeuds] chargé une fois (memory-map) ; chaque créneau en est une tranche
+    return get_affluence_tensor(_net, affluence_path)
 
 @st.cache_data(show_spinner="Chargement des stations…")
 def load_stations(stations_path):
-    df = pd.read_csv(stations_path)
+    df = read_table(stations_path, columns=["station", "station_key"])
     df["station_key"] = df["station_key"].astype(str)
     return df[["station", "station_key"]].drop_duplicates()
 
@@ -38,8 +45,9 @@ def load_monuments(monuments_path):
 
 @st.cache_data(show_spinner="Chargement des coordonnées…")
 def load_graph_nodes(graph_nodes_path):
-    df = pd.read_csv(graph_nodes_path)
+    df = read_table(graph_nodes_path)
     df["gare_key"] = df["gare_key"].astype(str)
+    df["gare_key_norm"] = normalize_names(df["gare_key"])
     return df
 
 def format_affluence(val):
@@ -83,10 +91,12 @@ def extract_trajet_info(txt):
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 GRAPH_PATH = os.path.join(DATA_DIR, "graph_blobia.gpickle")
+NETWORK_DIR = os.path.join(DATA_DIR, "graph_compiled")
 AFFLUENCE_PATH = os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv")
 STATIONS_PATH = os.path.join(DATA_DIR, "Stations_IDF_aligned.csv")
 MONUMENTS_PATH = os.path.join(DATA_DIR, "monuments.csv")
 GRAPH_NODES_PATH = os.path.join(DATA_DIR, "graph_nodes.csv")
+ROUTE_TABLE_DIR = os.path.join(DATA_DIR, "route_table")
 
 # ----------- Couleurs officielles lignes métro/RER -----------
 LINE_COLORS = {
@@ -187,21 +197,18 @@ def extract_grouped_line(line):
     else:
         return line
 
-import pickle
-import plotly.graph_objects as go
-
 def afficher_carte_reseau():
-    # Chargement du graphe picklé
-    with open(GRAPH_PATH, "rb") as f:
-        G = pickle.load(f)
+    # Réseau compilé (mis en cache) : arêtes d'adjacence = arêtes CSR entre deux stations différentes,
+    # sur la ligne de leurs noeuds (les correspondances relient deux noeuds d'une même station)
+    net = load_graph(NETWORK_DIR, GRAPH_PATH)
+    edges = [
+        (u, v, extract_grouped_line(net.line_names[net.line_of[u]]))
+        for u in range(net.n_nodes) for v in net.successors[u]
+        if u < v and net.station_of[u] != net.station_of[v]
+    ]
 
     # Liste groupée des lignes (ex : METRO 1, RER A, RER C)
-    all_grouped_lines = set()
-    for u, v, data in G.edges(data=True):
-        if "ligne" in data and data["ligne"] is not None:
-            grouped = extract_grouped_line(data["ligne"])
-            all_grouped_lines.add(grouped)
-    all_grouped_lines = sorted(all_grouped_lines)
+    all_grouped_lines = sorted({grouped for u, v, grouped in edges})
 
     default_lignes = ["METRO 1"] if "METRO 1" in all_grouped_lines else ([all_grouped_lines[0]] if all_grouped_lines else [])
 
@@ -219,18 +226,14 @@ def afficher_carte_reseau():
     fig = go.Figure()
 
     # Ajout des arêtes (avec filtre groupé)
-    for u, v, d in G.edges(data=True):
-        line_full = str(d.get('ligne', ''))
-        grouped = extract_grouped_line(line_full)
+    for u, v, grouped in edges:
         if grouped not in selected_lignes:
             continue
 
-        u_data = G.nodes[u]
-        v_data = G.nodes[v]
         color_rgb = LINE_COLORS.get(grouped, [0,0,0])
         fig.add_trace(go.Scattermapbox(
-            lon=[u_data['longitude'], v_data['longitude']],
-            lat=[u_data['latitude'], v_data['latitude']],
+            lon=[float(net.longitude[u]), float(net.longitude[v])],
+            lat=[float(net.latitude[u]), float(net.latitude[v])],
             mode='lines',
             line=dict(width=3, color=f"rgb{tuple(color_rgb)}"),
             hoverinfo='none',
@@ -239,15 +242,13 @@ def afficher_carte_reseau():
 
     # Ajout des noeuds (stations)
     all_nodes = set()
-    for u, v, d in G.edges(data=True):
-        line_full = str(d.get('ligne', ''))
-        grouped = extract_grouped_line(line_full)
+    for u, v, grouped in edges:
         if grouped in selected_lignes:
             all_nodes.add(u)
             all_nodes.add(v)
-    lats = [G.nodes[n]['latitude'] for n in all_nodes]
-    lons = [G.nodes[n]['longitude'] for n in all_nodes]
-    texts = [n.split("_")[0] for n in all_nodes]
+    lats = [float(net.latitude[n]) for n in all_nodes]
+    lons = [float(net.longitude[n]) for n in all_nodes]
+    texts = [net.node_names[n].split("_")[0] for n in all_nodes]
     fig.add_trace(go.Scattermapbox(
         lon=lons, lat=lats,
         mode='markers',
@@ -320,8 +321,15 @@ if page == "Calcul d'itinéraire":
         jours = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
         jour = st.selectbox("Jour du trajet", jours, index=0, key="jour")
         heure = st.slider("Heure du trajet", 0, 23, 8, key="heure")
-        
-        # Slider sans label
+
+        # Bouton avec blob happy à côté
+        col_btn, col_img = st.columns([2,1])
+        with col_btn:
+            submit = st.form_submit_button("Calculer l’itinéraire")
+
+    # Curseur hors du formulaire : les routes de tous les curseurs sont calculées en une passe,
+    # bouger le curseur ne relance pas de recherche
+    with st.sidebar:
         curseur = st.slider("Curseur de personnalisation (rapidité / affluence)", 1, 10, 5, key="curseur")
 
         # Images + labels dessous
@@ -335,22 +343,18 @@ if page == "Calcul d'itinéraire":
             st.image("images-interface/blob_zen.png", width=60)
             st.markdown("<div style='text-align:center; font-size:0.85em'></div>", unsafe_allow_html=True)
 
-            
-        # Bouton avec blob happy à côté
-        col_btn, col_img = st.columns([2,1])
-        with col_btn:
-            submit = st.form_submit_button("Calculer l’itinéraire")
-
 
     if submit:
         st.session_state['selected_trajet_idx'] = -1
         try:
             with st.spinner("Chargement du réseau et des données…"):
-                G = load_graph(GRAPH_PATH)
-                afflu_map = load_affluence(AFFLUENCE_PATH, jour, heure)
+                net = load_graph(NETWORK_DIR, GRAPH_PATH)
+                afflu_tensor = load_affluence(AFFLUENCE_PATH, net)
+                afflu_vec = afflu_tensor[slot_index(jour, heure)]
+                route_table = load_routes(ROUTE_TABLE_DIR, net, afflu_tensor)
 
             station_depart_key = station_affichage_to_key[station_depart_affichage]
-            stations_nodes = [n for n, d in G.nodes(data=True) if d.get("station_key", "") == station_depart_key]
+            stations_nodes = net.nodes_of_station(station_depart_key)
             if not stations_nodes:
                 st.error(f"Station de départ « {station_depart_affichage} » (clé: {station_depart_key}) introuvable dans le réseau.")
                 st.stop()
@@ -361,10 +365,11 @@ if page == "Calcul d'itinéraire":
                 monuments_csv=MONUMENTS_PATH,
                 stations_csv=GRAPH_NODES_PATH
             )
-            afflu_df = pd.read_csv(AFFLUENCE_PATH)
+            afflu_df = read_table(AFFLUENCE_PATH, columns=["station_key", "ligne"])
             line_to_station = dict()
+            afflu_keys = normalize_names(afflu_df["station_key"])
             for st_key, dist in arr_candidates:
-                for _, row in afflu_df[afflu_df["station_key"].apply(lambda x: normalize_name(str(x)) == normalize_name(st_key))].iterrows():
+                for _, row in afflu_df[afflu_keys == normalize_name(st_key)].iterrows():
                     line = str(row["ligne"])
                     if (line not in line_to_station) or (dist < line_to_station[line][1]):
                         line_to_station[line] = (normalize_name(st_key), dist)
@@ -372,32 +377,38 @@ if page == "Calcul d'itinéraire":
             arr_lines = [line for line in line_to_station.keys()]
 
             arr_node_ids = []
-            for node, data in G.nodes(data=True):
-                skey = normalize_name(data.get("station_key", ""))
-                line = str(data.get("ligne", ""))
+            for node, s, l in zip(net.node_names, net.station_of, net.line_of):
+                skey = normalize_name(net.station_names[s])
+                line = str(net.line_names[l])
                 if skey in arr_station_keys and line in arr_lines:
                     arr_node_ids.append(node)
 
             if not arr_station_keys:
                 st.error(f"Aucune station d’arrivée trouvée près du monument « {monument_arrivee} ».")
                 st.session_state['result'] = None
+                st.session_state['routes_par_curseur'] = None
                 st.stop()
 
-            result = find_best_route(
-                G=G,
-                affluence_mapping=afflu_map,
+            routes_par_curseur = find_routes_all_curseurs(
+                G=net,
+                affluence_mapping=afflu_vec,
                 station_depart=station_depart_key,
                 list_stations_arrivee=arr_station_keys,
-                curseur=curseur,
-                verbose=False
+                route_table=route_table,
+                monument=monument_arrivee,
+                jour=jour,
+                heure=heure
             )
-            st.session_state['result'] = result
-            st.session_state['afflu_map'] = afflu_map
+            st.session_state['routes_par_curseur'] = routes_par_curseur
+            st.session_state['result'] = routes_par_curseur.get(curseur)
         except Exception as e:
             import traceback
             st.error(f"Erreur lors du calcul : {e}\n\n{traceback.format_exc()}")
             st.session_state['result'] = None
+            st.session_state['routes_par_curseur'] = None
 
+    if not submit and st.session_state.get('routes_par_curseur'):
+        st.session_state['result'] = st.session_state['routes_par_curseur'].get(curseur)
     result = st.session_state.get('result', None)
     afflu_map = st.session_state.get('afflu_map', {})  # clé: station_key
     if result:
@@ -468,7 +479,7 @@ if page == "Calcul d'itinéraire":
                     for stop in path:
                         station_key = str(stop[0])
                         line = str(stop[1])
-                        matches = graph_nodes_df[graph_nodes_df["gare_key"].apply(lambda x: normalize_name(str(x)) == normalize_name(station_key))]
+                        matches = graph_nodes_df[graph_nodes_df["gare_key_norm"] == normalize_name(station_key)]
                         if not matches.empty:
                             lat = matches.iloc[0]["latitude"]
                             lon = matches.iloc[0]["longitude"]
@@ -0,0 +1,114 @@
+import os
+import sys
+import heapq
+import pickle
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from affluence_builder.get_affluence import get_affluence_mapping_from_file
+from blobia.blob_solver import blob_path_solver, curseur_weights, normalize_line
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.network import compile_network
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DEPARTS = ("aulnay sous bois", "cergy le haut", "aeroport d'orly")
+CURSEURS = (1, 5, 10)
+
+# -- Filtre anti-boucle de référence : version d'origine, recalculée sur tout le chemin à chaque arête --
+
+def reference_path_solver(G, affluence_mapping, nodes_depart, nodes_arrivee, curseur=1,
+                          max_iter=25000, topk=10):
+    """
+    blob_path_solver tel qu'avant le filtre incrémental ; renvoie [(raw_path, score)] des 3 meilleures routes.
+    """
+    alpha, beta, gamma = curseur_weights(curseur)
+    # Attributs des noeuds lus une fois (le filtre, lui, reste recalculé sur tout le chemin)
+    station = {n: d['station_key'] for n, d in G.nodes(data=True)}
+    ligne = {n: d['ligne'] for n, d in G.nodes(data=True)}
+
+    front = []
+    for dep in nodes_depart:
+        aff_init = affluence_mapping.get((station[dep], ligne[dep]), 0.2)
+        heapq.heappush(front, (0.0, dep, [dep], [aff_init], [ligne[dep]]))
+
+    visited = dict()
+    finals = []
+    it = 0
+    while front and it < max_iter and len(finals) < topk * 5:
+        it += 1
+        score, node, path, affluences, lignes = heapq.heappop(front)
+
+        if node in nodes_arrivee:
+            finals.append((score, path))
+            continue
+
+        key = (node, lignes[-1])
+        if key in visited and visited[key] <= score:
+            continue
+        visited[key] = score
+
+        for succ in G.neighbors(node):
+            succ_line = ligne[succ]
+            succ_aff = affluence_mapping.get((station[succ], succ_line), 0.2)
+            succ_station = station[succ]
+
+            potential_path = path + [succ]
+            stations_logiques = [(station[n], normalize_line(ligne[n])) for n in potential_path]
+            # 1. Pas plus de 2 passages par station
+            if [station[n] for n in potential_path].count(succ_station) > 2:
+                continue
+            # 2. Pas deux fois la même station avec la même ligne logique
+            if stations_logiques.count((succ_station, normalize_line(succ_line))) > 1:
+                continue
+            # 3. Pas trois passages d'affilée par la même station
+            if len(potential_path) >= 3:
+                if station[potential_path[-1]] == station[potential_path[-2]] == station[potential_path[-3]]:
+                    continue
+            # 4. Pas de changement de ligne logique sans changement effectif
+            if station[path[-1]] == succ_station and normalize_line(ligne[path[-1]]) == normalize_line(succ_line) \
+                    and succ_line != lignes[-1]:
+                continue
+
+            penalty = gamma if succ_line != lignes[-1] else 0.0
+            aff_moy = (sum(affluences) + succ_aff) / (len(affluences) + 1)
+            new_score = alpha * (len(path) + 1) + beta * aff_moy + penalty
+            heapq.heappush(front, (new_score, succ, path + [succ], affluences + [succ_aff], lignes + [succ_line]))
+
+    unique_routes = {}
+    for score, path in sorted(finals, key=lambda x: x[0]):
+        seq = tuple([station[n] for n in path])
+        if seq not in unique_routes:
+            unique_routes[seq] = (path, score)
+    return list(unique_routes.values())[:3]
+
+# -- Données --
+
+@pytest.fixture(scope="module")
+def graph():
+    with open(os.path.join(DATA_DIR, "graph_blobia.gpickle"), "rb") as f:
+        return pickle.load(f)
+
+@pytest.fixture(scope="module")
+def affluence():
+    return get_affluence_mapping_from_file(os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv"), "lundi", 8)
+
+def monuments():
+    return pd.read_csv(os.path.join(DATA_DIR, "monuments.csv"), encoding='cp1252')["Monument"].tolist()
+
+@pytest.mark.parametrize("monument", monuments())
+def test_filtre_incremental_identique_a_la_reference(graph, affluence, monument):
+    net = compile_network(graph)
+    arr_nodes = arrival_nodes_near_monument(
+        net, monument,
+        monuments_csv=os.path.join(DATA_DIR, "monuments.csv"),
+        stations_csv=os.path.join(DATA_DIR, "graph_nodes.csv")
+    )[1]
+    nodes_arrivee = [net.node_names[n] for n in arr_nodes]
+    for depart in DEPARTS:
+        nodes_depart = [net.node_names[n] for n in net.nodes_of_station(depart)]
+        for curseur in CURSEURS:
+            attendu = reference_path_solver(graph, affluence, nodes_depart, nodes_arrivee, curseur=curseur, topk=8)
+            obtenu = blob_path_solver(graph, affluence, nodes_depart, nodes_arrivee, curseur=curseur, topk=8)
+            assert [r["raw_path"] for r in obtenu] == [path for path, _ in attendu], (depart, curseur)
+            assert [r["score"] for r in obtenu] == pytest.approx([score for _, score in attendu], rel=1e-12, abs=0)
@@ -0,0 +1,61 @@
+import os
+import sys
+from functools import lru_cache
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from affluence_builder.affluence_tensor import get_affluence_tensor, slot_index
+from blobia.blob_solver import compiled_path_solver, SolverStats
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.network import load_network
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DEPARTS = ("la defense", "aeroport d'orly", "cergy le haut")
+CURSEURS = (1, 5, 10)
+BEAM_WIDTH = 200  # faisceau qui garde les meilleures étiquettes : même meilleure route que la recherche complète
+
+@pytest.fixture(scope="module")
+def reseau():
+    net = load_network(os.path.join(DATA_DIR, "graph_blobia.gpickle"))
+    affluence = get_affluence_tensor(net, os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv"))
+    return net, affluence[slot_index("lundi", 8)]
+
+@lru_cache(maxsize=None)
+def arrivee_monument(net, monument):
+    return arrival_nodes_near_monument(
+        net, monument,
+        monuments_csv=os.path.join(DATA_DIR, "monuments.csv"),
+        stations_csv=os.path.join(DATA_DIR, "graph_nodes.csv")
+    )[1]
+
+def monuments():
+    return pd.read_csv(os.path.join(DATA_DIR, "monuments.csv"), encoding='cp1252')["Monument"].tolist()
+
+@pytest.mark.parametrize("monument", monuments())
+def test_faisceau_meme_meilleure_route(reseau, monument):
+    net, affluence = reseau
+    arrivee = arrivee_monument(net, monument)
+    for depart in DEPARTS:
+        nodes_depart = net.nodes_of_station(depart)
+        for curseur in CURSEURS:
+            exact = compiled_path_solver(net, affluence, nodes_depart, arrivee, curseur=curseur, topk=8)
+            beam = compiled_path_solver(net, affluence, nodes_depart, arrivee, curseur=curseur, topk=8,
+                                        beam_width=BEAM_WIDTH)
+            if not exact:
+                continue
+            assert beam, (depart, curseur)
+            assert beam[0]["score"] == pytest.approx(exact[0]["score"], rel=1e-12, abs=0), (depart, curseur)
+            recherche = beam[0]["recherche"]
+            assert recherche["mode"] == "beam"
+            assert not (recherche["termine"] and recherche["beam_ecartees"] > 0)
+
+def test_bilan_sans_route(reseau):
+    net, affluence = reseau
+    arrivee = arrivee_monument(net, monuments()[0])
+    nodes_depart = net.nodes_of_station("la defense")
+    stats = SolverStats()
+    assert compiled_path_solver(net, affluence, nodes_depart, arrivee, deadline_ms=0, stats=stats) == []
+    assert stats.recherche["mode"] == "deadline"
+    assert stats.recherche["arret"] == "deadline"
+    assert not stats.recherche["termine"]
@@ -0,0 +1,60 @@
+import os
+import sys
+from functools import lru_cache
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from affluence_builder.affluence_tensor import build_affluence_tensor, slot_index, affluence_timeline
+from affluence_builder.get_affluence import load_affluence_table
+from blobia.blob_solver import compiled_path_solver
+from blobia.mapping import arrival_nodes_near_monument
+from blobia.network import load_network
+from graph_builder.chain_skip import build_chain_skip
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DEPARTS = ("la defense", "aulnay sous bois", "cergy le haut", "aeroport d'orly")
+CURSEURS = (1, 5, 10)
+MODES = {
+    "topk": dict(topk=8),
+    "k_routes": dict(topk=8, k_routes=3, diversite_min=0.2, labels_par_noeud=2),
+    "astar": dict(topk=8, k_routes=3, diversite_min=0.2, labels_par_noeud=2, astar=True),
+    "horaire": dict(topk=8),
+}
+
+@pytest.fixture(scope="module")
+def reseau():
+    net = load_network(os.path.join(DATA_DIR, "graph_blobia.gpickle"))
+    tensor = build_affluence_tensor(net, load_affluence_table(os.path.join(DATA_DIR, "Stations_IDF_aligned_affluence.csv")))
+    return net, build_chain_skip(net), tensor
+
+@lru_cache(maxsize=None)
+def arrivee_monument(net, monument):
+    return arrival_nodes_near_monument(
+        net, monument,
+        monuments_csv=os.path.join(DATA_DIR, "monuments.csv"),
+        stations_csv=os.path.join(DATA_DIR, "graph_nodes.csv")
+    )[1]
+
+def monuments():
+    return pd.read_csv(os.path.join(DATA_DIR, "monuments.csv"), encoding='cp1252')["Monument"].tolist()
+
+def resume(routes):
+    return [(r["raw_path"], r["score"], r.get("duree_min")) for r in routes]
+
+@pytest.mark.parametrize("mode", sorted(MODES))
+@pytest.mark.parametrize("monument", monuments())
+def test_chain_skip_memes_routes(reseau, monument, mode):
+    net, chain_skip, tensor = reseau
+    arrivee = arrivee_monument(net, monument)
+    options = dict(MODES[mode])
+    if mode == "horaire":
+        options["horaire"] = affluence_timeline(tensor, "lundi", 8, 0)
+    affluence = tensor[slot_index("lundi", 8)]
+    for depart in DEPARTS:
+        nodes_depart = net.nodes_of_station(depart)
+        for curseur in CURSEURS:
+            sans = compiled_path_solver(net, affluence, nodes_depart, arrivee, curseur=curseur, **options)
+            avec = compiled_path_solver(net, affluence, nodes_depart, arrivee, curseur=curseur,
+                                        chain_skip=chain_skip, **options)
+            assert resume(avec) == resume(sans), (depart, curseur)
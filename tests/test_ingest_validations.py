@@ -0,0 +1,36 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from affluence_builder.ingest_validations import ValidationAggregator, MOINS_DE_5
+
+def bloc(rows):
+    return pd.DataFrame(rows, columns=["date", "station", "tranche", "validations"], dtype=str)
+
+def test_formats_de_date_melanges():
+    aggregator = ValidationAggregator()
+    # Lundi 2 janvier 2023 écrit dans deux formats, puis lundi 9 janvier
+    aggregator.add(bloc([
+        ("2023-01-02", "Châtelet", "8H-9H", "100"),
+        ("02/01/2023", "Châtelet", "9H-10H", "50"),
+    ]))
+    aggregator.add(bloc([
+        ("09/01/2023", "Châtelet", "8H-9H", "300"),
+        (None, "Châtelet", "8H-9H", "1000"),
+    ]))
+    assert [len(d) for d in aggregator.dates] == [2, 0, 0, 0, 0, 0, 0]
+    table = aggregator.table().set_index("heure")["validations"]
+    assert table[8] == pytest.approx((100 + 300) / 2)
+    assert table[9] == pytest.approx(50 / 2)
+
+def test_moins_de_5():
+    aggregator = ValidationAggregator()
+    aggregator.add(bloc([
+        ("2023-01-03", "Châtelet", "8H-9H", "Moins de 5"),
+        ("2023-01-03", "Châtelet", "9H-10H", "ND"),
+    ]))
+    table = aggregator.table().set_index("heure")["validations"]
+    assert table[8] == MOINS_DE_5
+    assert table[9] == 0.0